@@ -6,3 +6,6 @@ class DeliveriesConfig(AppConfig):
     name = 'deliveries'
     verbose_name = 'Доставка'
     verbose_name_plural = 'Доставки'
+
+    def ready(self):
+        from deliveries import signals  # noqa: F401
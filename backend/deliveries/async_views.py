@@ -0,0 +1,195 @@
+"""
+Асинхронные варианты горячих эндпоинтов API для запуска под ASGI.
+
+Подключаются в deliveries/urls.py при ASYNC_API=True на тех же URL, что и
+viewsets из deliveries.views, и отдают тот же JSON. Асинхронно обслуживаются
+авторизованные GET-запросы с JSON-ответом: выборки идут через async ORM
+(acount, aget, async for), не занимая поток на всё время запроса.
+Всё остальное — запись, browsable API, ошибки аутентификации и валидации,
+параметры, для разбора которых нужна синхронная работа с БД, — передаётся
+исходному DRF-представлению через sync_to_async.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from deliveries.auth import CookieJWTAuthentication, CookieJWTStatelessAuthentication
+from deliveries.cache import aget_or_compute_summary, reference_cache
+from deliveries.metrics import serializing
+from deliveries.models import Delivery
+from deliveries.serializers import DeliverySerializer, DeliveryRowSerializer
+from deliveries.versions import aget_version, not_modified, validator_headers
+from deliveries.views import DeliveryViewSet, CargoTypeViewSet, ServiceViewSet, PackagingTypeViewSet
+
+# Параметры списка, которые разбираются без запросов к БД.
+# cargo_type/services валидируются ModelChoiceFilter, search ищет связанные записи.
+ASYNC_LIST_PARAMS = {'page', 'page_size', 'ordering', 'departure_datetime__gte', 'departure_datetime__lte'}
+ASYNC_SUMMARY_PARAMS = {'departure_datetime__gte', 'departure_datetime__lte', 'cargo_type', 'services'}
+
+
+def drf_fallback(viewset, actions):
+    view = sync_to_async(viewset.as_view(actions))
+
+    async def fallback(request, *args, **kwargs):
+        return await view(request, *args, **kwargs)
+    return fallback
+
+
+def accepts_json(request, allowed_params=None):
+    if request.method != 'GET' or 'format' in request.GET:
+        return False
+    if 'text/html' in request.headers.get('Accept', ''):
+        return False
+    return allowed_params is None or set(request.GET) <= allowed_params
+
+
+def json_response(data, allow, headers=None):
+    response = HttpResponse(JSONRenderer().render(data), content_type='application/json', headers=headers)
+    # Те же заголовки, что выставляет APIView.finalize_response
+    response['Allow'] = allow
+    response['Vary'] = 'Accept'
+    return response
+
+
+async def get_view(viewset, request, action, authentication_class, **kwargs):
+    """Экземпляр viewset с аутентифицированным DRF-запросом или None, если аутентификация не прошла."""
+    auth = await authentication_class().aauthenticate(request)
+    if auth is None:
+        return None
+    drf_request = Request(request)
+    drf_request.user, drf_request.auth = auth
+    return viewset(request=drf_request, format_kwarg=None, action=action, args=(), kwargs=kwargs)
+
+
+async def check_not_modified(request, view, allow):
+    """
+    Версия данных пользователя и заголовки ответа (см. DeliveryViewSet.check_not_modified);
+    третий элемент — готовый 304, если у клиента актуальный ответ.
+    """
+    user_id = view.request.user.pk
+    version = await aget_version(user_id)
+    headers = validator_headers(request, user_id, version)
+    response = not_modified(request, version, headers)
+    if response is not None:
+        response['Allow'] = allow
+        response['Vary'] = 'Accept'
+    return version, headers, response
+
+
+delivery_list_fallback = drf_fallback(DeliveryViewSet, {'get': 'list', 'post': 'create'})
+delivery_detail_fallback = drf_fallback(
+    DeliveryViewSet, {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+)
+delivery_summary_fallback = drf_fallback(DeliveryViewSet, {'get': 'summary_by_day'})
+
+
+@csrf_exempt
+async def delivery_list(request):
+    if not accepts_json(request, ASYNC_LIST_PARAMS):
+        return await delivery_list_fallback(request)
+    view = await get_view(DeliveryViewSet, request, 'list', CookieJWTAuthentication)
+    if view is None:
+        return await delivery_list_fallback(request)
+    allow = 'GET, POST, HEAD, OPTIONS'
+    _, headers, response = await check_not_modified(request, view, allow)
+    if response is not None:
+        return response
+
+    try:
+        queryset = view.filter_queryset(view.get_queryset())
+        rows = queryset.prefetch_related(None).values(*DeliveryRowSerializer.values_fields)
+        page = await view.paginator.apaginate_queryset(rows, view.request, view=view)
+    except APIException:
+        return await delivery_list_fallback(request)
+
+    serializer = DeliveryRowSerializer(page, many=True, context=view.get_serializer_context())
+    with serializing():
+        data = await serializer.ato_representation(page)
+    return json_response(view.paginator.get_paginated_response(data).data, allow=allow, headers=headers)
+
+
+@csrf_exempt
+async def delivery_detail(request, pk):
+    if not accepts_json(request, set()):
+        return await delivery_detail_fallback(request, pk=pk)
+    view = await get_view(DeliveryViewSet, request, 'retrieve', CookieJWTAuthentication, pk=pk)
+    if view is None:
+        return await delivery_detail_fallback(request, pk=pk)
+    allow = 'GET, PUT, PATCH, DELETE, HEAD, OPTIONS'
+    _, headers, response = await check_not_modified(request, view, allow)
+    if response is not None:
+        return response
+
+    try:
+        instance = await view.get_queryset().aget(pk=pk)
+    except Delivery.DoesNotExist:
+        return await delivery_detail_fallback(request, pk=pk)
+
+    data = DeliverySerializer(instance, context=view.get_serializer_context()).data
+    return json_response(data, allow=allow, headers=headers)
+
+
+@csrf_exempt
+async def delivery_summary(request):
+    if not accepts_json(request, ASYNC_SUMMARY_PARAMS):
+        return await delivery_summary_fallback(request)
+    view = await get_view(DeliveryViewSet, request, 'summary_by_day', CookieJWTAuthentication)
+    if view is None:
+        return await delivery_summary_fallback(request)
+    allow = 'GET, HEAD, OPTIONS'
+    version, headers, response = await check_not_modified(request, view, allow)
+    if response is not None:
+        return response
+
+    try:
+        # ModelChoiceFilter проверяет cargo_type/services запросом к БД
+        params = await sync_to_async(view.get_summary_params)(view.request)
+    except APIException:
+        return await delivery_summary_fallback(request)
+
+    user = view.request.user
+    result, cached = await aget_or_compute_summary(
+        user.pk, params, lambda: view.acompute_summary(user, params), version=version[0]
+    )
+    return json_response(result, allow=allow, headers={**headers, 'X-Cache': 'HIT' if cached else 'MISS'})
+
+
+def reference_list(viewset):
+    """
+    Список справочника из кэша процесса (см. ReferenceCacheMixin) без обращения
+    к БД и без потока; промах обрабатывает DRF-представление, которое заполняет кэш.
+    """
+    fallback = drf_fallback(viewset, {'get': 'list'})
+
+    @csrf_exempt
+    async def view(request):
+        if not accepts_json(request):
+            return await fallback(request)
+        if await CookieJWTStatelessAuthentication().aauthenticate(request) is None:
+            return await fallback(request)
+        entry = reference_cache(viewset.queryset.model).get(request.path)
+        if entry is None:
+            return await fallback(request)
+
+        response = get_conditional_response(request, etag=entry.etag)
+        if response is not None:
+            response['Allow'] = 'GET, HEAD, OPTIONS'
+            response['Vary'] = 'Accept'
+            return response
+        try:
+            data = viewset.reference_page(entry, Request(request))
+        except NotFound:
+            # Несуществующую страницу оформит DRF-представление
+            return await fallback(request)
+        return json_response(data, allow='GET, HEAD, OPTIONS', headers={'ETag': entry.etag})
+    view.__name__ = view.__qualname__ = f'reference_list[{viewset.__name__}]'  # имя для метрик
+    return view
+
+
+cargo_list = reference_list(CargoTypeViewSet)
+service_list = reference_list(ServiceViewSet)
+packaging_list = reference_list(PackagingTypeViewSet)
@@ -1,7 +1,33 @@
-from rest_framework_simplejwt.authentication import JWTAuthentication
+import copy
+import logging
+import threading
+from collections import Counter
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from deliveries.cache import user_cache, user_stats
+
+logger = logging.getLogger(__name__)
+
+# Отказы аутентификации по причинам (token_not_valid, user_not_found, ...) в пределах процесса
+_failures = Counter()
+_failures_lock = threading.Lock()
+
+
+def auth_failures():
+    with _failures_lock:
+        return dict(_failures)
+
+
+class CookieTokenMixin:
+    """Access-токен из куки access_token; невалидный токен — анонимный запрос."""
 
-class CookieJWTAuthentication(JWTAuthentication):
     def authenticate(self, request):
         token = request.COOKIES.get('access_token')
         if token is None:
@@ -9,9 +35,58 @@ class CookieJWTAuthentication(JWTAuthentication):
         try:
             validated_token = self.get_validated_token(token)
             return self.get_user(validated_token), validated_token
-        except Exception:
+        except AuthenticationFailed as exc:
+            # InvalidToken — подкласс AuthenticationFailed
+            reason = 'token_not_valid' if isinstance(exc, InvalidToken) else exc.get_codes()
+            with _failures_lock:
+                _failures[reason] += 1
+            logger.debug('JWT authentication failed: %s', reason)
             return None
 
+    async def aauthenticate(self, request):
+        """authenticate для async-представлений (deliveries.async_views)."""
+        return await sync_to_async(self.authenticate)(request)
+
     def enforce_csrf(self, request):
         return
 
+
+class CookieJWTAuthentication(CookieTokenMixin, JWTAuthentication):
+    """
+    Пользователь из БД по id из токена. При AUTH_USER_CACHE_TIMEOUT > 0
+    берётся из кэша процесса (см. deliveries.cache.user_cache): запрос
+    к auth_user выполняется только при промахе.
+    """
+
+    def get_user(self, validated_token):
+        if not settings.AUTH_USER_CACHE_TIMEOUT:
+            return super().get_user(validated_token)
+
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        cache = user_cache()
+        user = cache.get(user_id) if user_id is not None else None
+        if user is None:
+            user_stats.miss()
+            # Неактивных и несуществующих пользователей отсеивает super()
+            user = super().get_user(validated_token)
+            cache.set(user_id, user)
+        else:
+            user_stats.hit()
+            if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        # Копия, чтобы запросы не делили один экземпляр модели
+        return copy.copy(user)
+
+
+class CookieJWTStatelessAuthentication(CookieTokenMixin, JWTStatelessUserAuthentication):
+    """
+    TokenUser из содержимого токена без обращения к БД — для эндпоинтов
+    только на чтение, которым не нужен ORM-пользователь. Деактивация
+    пользователя здесь не видна до истечения access-токена.
+    """
+
+    async def aauthenticate(self, request):
+        # Токен проверяется без обращения к БД — поток не нужен
+        return self.authenticate(request)
@@ -0,0 +1,54 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db.models import Count
+
+
+def percentile(samples, percent):
+    """Перцентиль по отсортированной выборке (метод ближайшего ранга)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Сводка по замерам в миллисекундах."""
+    return {
+        'runs': len(samples),
+        'min': round(min(samples), 3),
+        'p50': round(percentile(samples, 50), 3),
+        'p95': round(percentile(samples, 95), 3),
+        'p99': round(percentile(samples, 99), 3),
+        'max': round(max(samples), 3),
+        'mean': round(statistics.fmean(samples), 3),
+    }
+
+
+def measure(func, repeat=20, warmup=2):
+    """Выполняет func warmup + repeat раз и возвращает сводку по времени выполнения."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def resolve_user(username=None):
+    """Пользователь для замеров: указанный или с наибольшим числом доставок."""
+    User = get_user_model()
+    if username:
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {username} не найден.')
+    user = User.objects.annotate(n=Count('deliveries')).order_by('-n').first()
+    if user is None:
+        raise CommandError('В базе нет пользователей — сначала выполните populate_db.')
+    return user
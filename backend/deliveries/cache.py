@@ -0,0 +1,196 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+SUMMARY_CACHE_ALIAS = 'summary'
+
+
+class TTLCache:
+    """
+    Потокобезопасный кэш в памяти процесса с ограничением размера (LRU)
+    и временем жизни записей.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CacheStats:
+    """Счётчики попаданий и промахов кэша (в пределах процесса)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else None,
+        }
+
+
+summary_stats = CacheStats()
+
+
+def summary_cache_key(user_id, params, version):
+    """
+    Ключ записи: пользователь, версия его данных (deliveries.versions) и
+    нормализованные параметры запроса. Смена версии делает все записи
+    пользователя недостижимыми — они вытесняются по TTL или размеру кэша.
+    """
+    normalized = '&'.join(
+        f'{name}={value}' for name, value in sorted(params.items())
+        if value not in (None, '')
+    )
+    digest = hashlib.sha1(normalized.encode()).hexdigest()
+    return f'summary:{user_id}:{version}:{digest}'
+
+
+def get_or_compute_summary(user_id, params, compute, version):
+    """
+    Вернуть (результат, попадание в кэш). При промахе результат вычисляется
+    функцией compute и сохраняется с TTL из настроек кэша.
+    """
+    cache = caches[SUMMARY_CACHE_ALIAS]
+    key = summary_cache_key(user_id, params, version)
+    result = cache.get(key)
+    if result is not None:
+        summary_stats.hit()
+        return result, True
+    summary_stats.miss()
+    result = compute()
+    cache.set(key, result)
+    return result, False
+
+
+async def aget_or_compute_summary(user_id, params, compute, version):
+    """Асинхронный вариант get_or_compute_summary: compute — корутинная функция."""
+    cache = caches[SUMMARY_CACHE_ALIAS]
+    key = summary_cache_key(user_id, params, version)
+    result = await cache.aget(key)
+    if result is not None:
+        summary_stats.hit()
+        return result, True
+    summary_stats.miss()
+    result = await compute()
+    await cache.aset(key, result)
+    return result, False
+
+
+class ReferenceEntry:
+    """Готовый ответ справочника: данные и их ETag."""
+
+    def __init__(self, data, etag):
+        self.data = data
+        self.etag = etag
+
+
+# Справочники (типы груза, услуги, упаковка) кэшируются в памяти процесса:
+# отдельный TTLCache на модель, сбрасывается сигналами save/delete этой модели.
+# Другие процессы видят изменения не позже чем через REFERENCE_CACHE_TIMEOUT.
+_reference_caches = {}
+_reference_caches_lock = threading.Lock()
+
+
+def reference_cache(model):
+    label = model._meta.label_lower
+    with _reference_caches_lock:
+        if label not in _reference_caches:
+            _reference_caches[label] = TTLCache(
+                maxsize=settings.REFERENCE_CACHE_MAX_ENTRIES,
+                ttl=settings.REFERENCE_CACHE_TIMEOUT,
+            )
+        return _reference_caches[label]
+
+
+def invalidate_reference(model):
+    reference_cache(model).clear()
+
+
+# Пользователи для CookieJWTAuthentication: кэш в памяти процесса по id из токена,
+# включается AUTH_USER_CACHE_TIMEOUT > 0. Сбрасывается сигналами save/delete
+# пользователя; другие процессы видят изменения не позже чем через TTL.
+user_stats = CacheStats()
+_user_cache = None
+_user_cache_lock = threading.Lock()
+
+
+def user_cache():
+    global _user_cache
+    with _user_cache_lock:
+        if _user_cache is None:
+            _user_cache = TTLCache(
+                maxsize=settings.AUTH_USER_CACHE_MAX_ENTRIES,
+                ttl=settings.AUTH_USER_CACHE_TIMEOUT,
+            )
+        return _user_cache
+
+
+def invalidate_user(user_id):
+    user_cache().delete(user_id)
+
+
+# Номера транспорта для приёма доставок (deliveries/ingest.py): номер → id TransportModel
+# в памяти процесса. Сбрасывается сигналами save/delete TransportModel; другие процессы
+# видят переименование номера не позже чем через REFERENCE_CACHE_TIMEOUT.
+_plate_cache = None
+_plate_cache_lock = threading.Lock()
+
+
+def plate_cache():
+    global _plate_cache
+    with _plate_cache_lock:
+        if _plate_cache is None:
+            _plate_cache = TTLCache(
+                maxsize=settings.PLATE_CACHE_MAX_ENTRIES,
+                ttl=settings.REFERENCE_CACHE_TIMEOUT,
+            )
+        return _plate_cache
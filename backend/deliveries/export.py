@@ -0,0 +1,120 @@
+"""Потоковая выгрузка доставок в CSV и NDJSON."""
+import csv
+import json
+
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import OuterRef, Q
+from django.utils import timezone
+
+from deliveries.models import Service
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# (имя колонки, поле для values_list)
+EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('departure_datetime', 'departure_datetime'),
+    ('arrival_datetime', 'arrival_datetime'),
+    ('distance_km', 'distance_km'),
+    ('status', 'status'),
+    ('technical_state', 'technical_state'),
+    ('plate_number', 'transport_model__plate_number'),
+    ('packaging', 'packaging__title'),
+    ('cargo_type', 'cargo_type__name'),
+    ('services', 'service_names'),
+    ('media_file', 'media_file'),
+)
+SERVICES_SEPARATOR = '; '
+
+
+def export_rows(queryset, chunk_size=2000):
+    """
+    Итератор кортежей для выгрузки. Услуги собираются в массив коррелированным
+    подзапросом в том же SQL, а строки читаются серверным курсором порциями
+    по chunk_size, поэтому память не зависит от размера выгрузки.
+    """
+    service_names = ArraySubquery(
+        Service.objects.filter(deliveries=OuterRef('pk')).order_by('id').values('name')
+    )
+    rows = (
+        queryset
+        .prefetch_related(None)
+        .annotate(service_names=service_names)
+        .values_list(*(field for _, field in EXPORT_COLUMNS))
+    )
+    if connections[rows.db].settings_dict['DISABLE_SERVER_SIDE_CURSORS']:
+        return _keyset_chunks(rows, chunk_size)
+    return rows.iterator(chunk_size=chunk_size)
+
+
+def _keyset_chunks(rows, chunk_size):
+    """
+    Порции по chunk_size без серверного курсора (DISABLE_SERVER_SIDE_CURSORS,
+    например за pgbouncer в режиме transaction pooling): каждая следующая
+    порция выбирается условием «после последней строки» по полям сортировки и id.
+    """
+    ordering = list(rows.query.order_by or rows.model._meta.ordering)
+    if 'id' not in (name.lstrip('-') for name in ordering):
+        ordering.append('id')
+    columns = [field for _, field in EXPORT_COLUMNS]
+    keys = [(name.lstrip('-'), name.startswith('-'), columns.index(name.lstrip('-'))) for name in ordering]
+    rows = rows.order_by(*ordering)
+
+    last = None
+    while True:
+        chunk = list((rows if last is None else rows.filter(_after_row(keys, last)))[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]
+
+
+def _after_row(keys, row):
+    """(a, b, id) строго после строки row с учётом направления сортировки каждого поля."""
+    condition = Q(pk__in=[])
+    equal = Q()
+    for name, descending, index in keys:
+        condition |= equal & Q(**{f'{name}__{"lt" if descending else "gt"}': row[index]})
+        equal &= Q(**{name: row[index]})
+    return condition
+
+
+def _format_value(value):
+    if hasattr(value, 'tzinfo'):
+        return timezone.localtime(value).isoformat()
+    return value
+
+
+class _Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    services_index = [name for name, _ in EXPORT_COLUMNS].index('services')
+    for row in rows:
+        row = [_format_value(value) for value in row]
+        row[services_index] = SERVICES_SEPARATOR.join(row[services_index])
+        yield writer.writerow(row)
+
+
+def stream_ndjson(rows):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    for row in rows:
+        record = dict(zip(names, (_format_value(value) for value in row)))
+        yield json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+STREAMERS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+}
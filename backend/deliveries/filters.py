@@ -0,0 +1,109 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django_filters.constants import EMPTY_VALUES
+from django_filters.rest_framework import DateTimeFilter
+from rest_framework.filters import SearchFilter
+
+# Латинские буквы, совпадающие по начертанию с допустимыми буквами номеров
+PLATE_LOOKALIKES = str.maketrans('ABEKMHOPCTYX', 'АВЕКМНОРСТУХ')
+
+
+def local_date(value):
+    """Календарная дата момента value в часовом поясе TIME_ZONE."""
+    if timezone.is_aware(value):
+        value = timezone.localtime(value, timezone.get_default_timezone())
+    return value.date()
+
+
+def local_day_start(day):
+    """Начало суток day (00:00) в часовом поясе TIME_ZONE."""
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_default_timezone())
+
+
+def local_day_range(date_from=None, date_to=None):
+    """
+    Полуоткрытый интервал [начало date_from, начало дня после date_to)
+    в виде lookup-ов для DateTimeField. Любая из границ может отсутствовать.
+    """
+    bounds = {}
+    if date_from is not None:
+        bounds['gte'] = local_day_start(date_from)
+    if date_to is not None:
+        bounds['lt'] = local_day_start(date_to + timedelta(days=1))
+    return bounds
+
+
+class LocalDateFilter(DateTimeFilter):
+    """
+    Фильтр DateTimeField по календарной дате в TIME_ZONE.
+
+    Вместо `поле::date >= дата` строит сравнение самого столбца с границами
+    суток, поэтому запрос остаётся sargable и использует btree-индекс.
+    lookup_expr: 'gte' — не раньше указанной даты, 'lte' — не позже неё.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        day = local_date(value)
+        if self.lookup_expr == 'gte':
+            bounds = local_day_range(date_from=day)
+        elif self.lookup_expr == 'lte':
+            bounds = local_day_range(date_to=day)
+        else:
+            raise ValueError(f'Неподдерживаемый lookup_expr: {self.lookup_expr}')
+        lookups = {f'{self.field_name}__{lookup}': bound for lookup, bound in bounds.items()}
+        qs = self.get_method(qs)(**lookups)
+        if self.distinct:
+            qs = qs.distinct()
+        return qs
+
+
+def normalize_plate(term):
+    """Привести ввод номера к записи в БД: верхний регистр, латинские двойники — в кириллицу."""
+    return term.upper().translate(PLATE_LOOKALIKES)
+
+
+class RelatedSearchFilter(SearchFilter):
+    """
+    SearchFilter для полей связанных моделей (`relation__field`).
+
+    Вместо JOIN и OR по столбцам разных таблиц сначала ищутся подходящие
+    записи связанной таблицы (по trigram-индексу), затем основная таблица
+    фильтруется по `relation_id IN (...)` через индекс внешнего ключа.
+    Если совпадений больше related_ids_limit, список не выбирается, а
+    подставляется подзапросом. Префиксы search_fields (^, =, @, $)
+    не поддерживаются.
+
+    Термы можно нормализовать по полям через атрибут view
+    `search_normalizers = {поле: функция}`.
+    """
+    related_ids_limit = 1000
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+        if not search_fields or not search_terms:
+            return queryset
+
+        normalizers = getattr(view, 'search_normalizers', {})
+        for term in search_terms:
+            condition = Q(pk__in=[])
+            for field in search_fields:
+                value = normalizers[field](term) if field in normalizers else term
+                condition |= self.get_field_condition(queryset.model, field, value)
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def get_field_condition(self, model, field, value):
+        if '__' not in field:
+            return Q(**{f'{field}__icontains': value})
+        relation, lookup = field.split('__', 1)
+        related_model = model._meta.get_field(relation).related_model
+        matches = related_model._default_manager.filter(**{f'{lookup}__icontains': value}).values_list('pk', flat=True)
+        ids = list(matches[:self.related_ids_limit + 1])
+        if len(ids) > self.related_ids_limit:
+            return Q(**{f'{relation}__in': matches})
+        return Q(**{f'{relation}__in': ids})
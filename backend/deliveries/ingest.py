@@ -0,0 +1,308 @@
+"""
+Приём доставок пачками: POST /deliveries/bulk/ (массив JSON или NDJSON).
+
+Строка — объект с номером транспорта и справочниками (id или название,
+как в выгрузке /deliveries/export/):
+
+    {"plate_number": "А123ВС", "departure_datetime": "2025-05-01T08:00:00+03:00",
+     "arrival_datetime": "2025-05-01T17:30:00+03:00", "distance_km": "412.50",
+     "status": "pending", "packaging": 1, "cargo_type": 2, "services": [1, 3],
+     "technical_state": "ok"}
+
+Проверка идёт в два шага. parse_row разбирает и проверяет поля одной строки
+без обращений к БД (команда import_deliveries выполняет его в других процессах).
+Затем для всей пачки сразу находятся id справочников (таблицы «id или
+название → id» в кэше справочников процесса) и id номеров транспорта:
+известные — из кэша номеров, остальные одним запросом, а отсутствующие в БД
+создаются одним bulk_create. Строки с ошибками не записываются и возвращаются
+с номером и ошибками по полям, остальные записываются bulk_create — доставки
+и связи с услугами — в одной транзакции на пачку вместе с обновлением дневной
+сводки и версии данных пользователя (bulk_create не отправляет сигналов).
+"""
+import json
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from deliveries import rollup, versions
+from deliveries.cache import plate_cache, reference_cache
+from deliveries.filters import normalize_plate
+from deliveries.models import PLATE_REGEX, CargoType, Delivery, DeliveryStatusEnum, PackagingType, Service, \
+    TransportModel
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+STATUSES = frozenset(DeliveryStatusEnum.values)
+TECHNICAL_STATES = frozenset(value for value, _ in Delivery.TECH_STATE_CHOICES)
+# max_digits=7, decimal_places=2
+DISTANCE_LIMIT = Decimal('100000')
+CENT = Decimal('0.01')
+REFERENCE_LOOKUP_KEY = 'ingest:lookup'
+
+DeliveryServices = Delivery.services.through
+
+
+class MalformedLine:
+    """Строка NDJSON, которая не разбирается как JSON."""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def iter_ndjson(stream):
+    """Объекты NDJSON из потока stream построчно, не читая тело целиком; пустые строки пропускаются."""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            yield MalformedLine(f'Некорректный JSON: {exc}.')
+
+
+def _parse_datetime(value):
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_default_timezone())
+    return parsed
+
+
+def _parse_reference(value):
+    """Ссылка на справочник: положительный id или непустое название; None — некорректное значение."""
+    if isinstance(value, str):
+        return value.strip() or None
+    # bool — подкласс int, но id им не бывает
+    return value if isinstance(value, int) and not isinstance(value, bool) and value > 0 else None
+
+
+def parse_row(raw):
+    """
+    Разобрать строку raw без обращений к БД: (значения, номер транспорта, ссылки на услуги)
+    или None и ошибки {поле: [сообщение]} в формате ошибок сериализаторов DRF.
+    """
+    if isinstance(raw, MalformedLine):
+        return None, {'non_field_errors': [raw.message]}
+    if not isinstance(raw, dict):
+        return None, {'non_field_errors': ['Ожидается объект.']}
+    errors = {}
+
+    plate = raw.get('plate_number')
+    if not isinstance(plate, str) or not plate.strip():
+        errors['plate_number'] = ['Обязательное поле.']
+    else:
+        plate = normalize_plate(plate.strip())
+        if PLATE_REGEX.regex.match(plate) is None:
+            errors['plate_number'] = [PLATE_REGEX.message]
+
+    departure = _parse_datetime(raw.get('departure_datetime'))
+    if departure is None:
+        errors['departure_datetime'] = ['Ожидается дата и время в формате ISO 8601.']
+    arrival = _parse_datetime(raw.get('arrival_datetime'))
+    if arrival is None:
+        errors['arrival_datetime'] = ['Ожидается дата и время в формате ISO 8601.']
+    elif departure is not None and arrival < departure:
+        errors['arrival_datetime'] = ['Время доставки раньше времени отправления.']
+
+    distance = raw.get('distance_km')
+    try:
+        if isinstance(distance, bool) or not isinstance(distance, (int, float, str)):
+            raise InvalidOperation
+        distance = Decimal(str(distance)).quantize(CENT)
+        if not 0 <= distance < DISTANCE_LIMIT:
+            raise InvalidOperation
+    except InvalidOperation:
+        errors['distance_km'] = [f'Ожидается число от 0 до {DISTANCE_LIMIT}.']
+
+    # Список или объект в поле не хешируются: проверка «in» по frozenset упала бы с TypeError
+    status = raw.get('status', DeliveryStatusEnum.PENDING)
+    if not isinstance(status, str) or status not in STATUSES:
+        errors['status'] = [f'Допустимые значения: {", ".join(sorted(STATUSES))}.']
+    technical_state = raw.get('technical_state', 'ok')
+    if not isinstance(technical_state, str) or technical_state not in TECHNICAL_STATES:
+        errors['technical_state'] = [f'Допустимые значения: {", ".join(sorted(TECHNICAL_STATES))}.']
+
+    packaging = _parse_reference(raw.get('packaging'))
+    if packaging is None:
+        errors['packaging'] = ['Ожидается id или название упаковки.']
+    cargo_type = raw.get('cargo_type')
+    if cargo_type in (None, ''):
+        cargo_type = None
+    else:
+        cargo_type = _parse_reference(cargo_type)
+        if cargo_type is None:
+            errors['cargo_type'] = ['Ожидается id или название типа груза либо null.']
+
+    services = raw.get('services', [])
+    if not isinstance(services, list) or any(_parse_reference(service) is None for service in services):
+        errors['services'] = ['Ожидается список id или названий услуг.']
+
+    if errors:
+        return None, errors
+    values = {
+        'departure_datetime': departure,
+        'arrival_datetime': arrival,
+        'distance_km': distance,
+        'status': status,
+        'technical_state': technical_state,
+        'packaging_id': packaging,
+        'cargo_type_id': cargo_type,
+    }
+    # До resolve_references в *_id и списке услуг — ссылки (id или название)
+    return (values, plate, list(dict.fromkeys(_parse_reference(service) for service in services))), None
+
+
+def reference_lookup(model, name_field, refs):
+    """
+    Таблица {id или название: id} справочника model. Кэшируется; ссылки из refs,
+    которых в ней нет, дочитываются одним запросом только по ним и добавляются
+    к таблице. У повторяющихся названий — меньший id.
+    """
+    cache = reference_cache(model)
+    lookup = cache.get(REFERENCE_LOOKUP_KEY)
+    if lookup is None:
+        lookup = {}
+        for pk, name in model.objects.order_by('-pk').values_list('pk', name_field):
+            lookup[pk] = pk
+            if name:
+                lookup[name] = pk
+        cache.set(REFERENCE_LOOKUP_KEY, lookup)
+        return lookup
+
+    missing = refs - lookup.keys()
+    if not missing:
+        return lookup
+    names = {ref for ref in missing if isinstance(ref, str)}
+    ids = missing - names
+    # Несуществующие ссылки (мусор от клиента) не заставляют перечитывать весь справочник
+    found = model.objects.filter(Q(pk__in=ids) | Q(**{f'{name_field}__in': names})).order_by('-pk')
+    # Таблица из кэша могла уже попасть в другие потоки: дополняется копия
+    lookup = dict(lookup)
+    for pk, name in found.values_list('pk', name_field):
+        lookup[pk] = pk
+        if name in names:
+            lookup[name] = pk
+    cache.set(REFERENCE_LOOKUP_KEY, lookup)
+    return lookup
+
+
+def resolve_plates(plates):
+    """{номер: id TransportModel} для номеров plates; отсутствующие в БД создаются."""
+    cache = plate_cache()
+    resolved = {}
+    missing = []
+    for plate in plates:
+        pk = cache.get(plate)
+        if pk is None:
+            missing.append(plate)
+        else:
+            resolved[plate] = pk
+    if not missing:
+        return resolved
+
+    found = dict(TransportModel.objects.filter(plate_number__in=missing).values_list('plate_number', 'pk'))
+    new = [plate for plate in missing if plate not in found]
+    if new:
+        # Тот же номер мог одновременно создать параллельный запрос — id перечитываются
+        TransportModel.objects.bulk_create([TransportModel(plate_number=plate) for plate in new],
+                                           ignore_conflicts=True)
+        found.update(TransportModel.objects.filter(plate_number__in=new).values_list('plate_number', 'pk'))
+
+    def remember():
+        for plate, pk in found.items():
+            cache.set(plate, pk)
+    # Созданные в откатившейся транзакции номера в кэш не попадают
+    transaction.on_commit(remember)
+    resolved.update(found)
+    return resolved
+
+
+def resolve_references(parsed, errors):
+    """
+    Заменить в строках parsed ссылки на справочники их id. Строки с несуществующими
+    ссылками убираются и добавляются в errors; возвращаются остальные.
+    """
+    packaging = reference_lookup(PackagingType, 'title', {values['packaging_id'] for _, (values, _, _) in parsed})
+    cargo_types = reference_lookup(
+        CargoType, 'name', {values['cargo_type_id'] for _, (values, _, _) in parsed} - {None}
+    )
+    services = reference_lookup(Service, 'name', {service for _, (_, _, refs) in parsed for service in refs})
+
+    valid = []
+    for index, (values, plate, service_refs) in parsed:
+        row_errors = {}
+        if values['packaging_id'] not in packaging:
+            row_errors['packaging'] = [f'Нет упаковки {values["packaging_id"]!r}.']
+        if values['cargo_type_id'] is not None and values['cargo_type_id'] not in cargo_types:
+            row_errors['cargo_type'] = [f'Нет типа груза {values["cargo_type_id"]!r}.']
+        unknown = [service for service in service_refs if service not in services]
+        if unknown:
+            row_errors['services'] = [f'Нет услуг {", ".join(map(repr, unknown))}.']
+        if row_errors:
+            errors.append({'index': index, 'errors': row_errors})
+            continue
+        values['packaging_id'] = packaging[values['packaging_id']]
+        if values['cargo_type_id'] is not None:
+            values['cargo_type_id'] = cargo_types[values['cargo_type_id']]
+        service_ids = sorted({services[service] for service in service_refs})
+        valid.append((index, (values, plate, service_ids)))
+    return valid
+
+
+def write_batch(rows, user_id):
+    """Записать проверенные строки [(values, номер, id услуг)] одной транзакцией; возвращает id доставок."""
+    contributions = Counter()
+    with transaction.atomic():
+        # Новые номера создаются в той же транзакции: если запись доставок откатится,
+        # не останется ни их строк, ни записей в кэше номеров
+        plates = resolve_plates({plate for _, plate, _ in rows})
+        deliveries = [
+            Delivery(transport_model_id=plates[plate], user_id=user_id, **values)
+            for values, plate, _ in rows
+        ]
+        Delivery.objects.bulk_create(deliveries)
+        DeliveryServices.objects.bulk_create([
+            DeliveryServices(delivery_id=delivery.pk, service_id=service_id)
+            for delivery, (_, _, service_ids) in zip(deliveries, rows)
+            for service_id in service_ids
+        ])
+        for delivery, (values, _, service_ids) in zip(deliveries, rows):
+            rollup.add_contribution(contributions, user_id, values['departure_datetime'],
+                                    values['cargo_type_id'], values['status'], service_ids)
+        rollup.apply_delta(Counter(), contributions)
+        versions.bump([user_id])
+    return [delivery.pk for delivery in deliveries]
+
+
+def ingest(raw_rows, user_id, batch_size=None):
+    """
+    Принять строки raw_rows (итерируемые, читаются по пачке) от имени пользователя user_id.
+    Возвращает (число созданных доставок, ошибки [{'index': номер строки с 0, 'errors': {...}}]).
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    rows = enumerate(raw_rows)
+    created = 0
+    errors = []
+    while batch := list(islice(rows, batch_size)):
+        parsed = []
+        for index, raw in batch:
+            row, row_errors = parse_row(raw)
+            if row_errors:
+                errors.append({'index': index, 'errors': row_errors})
+            else:
+                parsed.append((index, row))
+        valid = resolve_references(parsed, errors) if parsed else []
+        if valid:
+            created += len(write_batch([row for _, row in valid], user_id))
+    errors.sort(key=lambda error: error['index'])
+    return created, errors
@@ -0,0 +1,208 @@
+"""
+Очередь фоновых заданий на таблице Job, без внешнего брокера.
+
+enqueue() добавляет задание, воркер (команда run_jobs) забирает готовые
+задания запросом с FOR UPDATE SKIP LOCKED — параллельные воркеры не получат
+одно задание и не ждут друг друга — и выполняет их в пуле процессов.
+Пока задание выполняется, воркер обновляет locked_at; задание без сигнала
+дольше JOBS_LEASE_SECONDS (воркер упал) возвращается в очередь.
+Ошибка обработчика — повтор через JOBS_RETRY_BACKOFF_SECONDS × 2^(попытка − 1),
+после max_attempts попыток или при JobError — статус failed.
+Файлы выгрузок хранятся EXPORT_RESULT_TTL_HOURS часов: их удаляет
+purge_expired_exports, который воркер вызывает между опросами очереди.
+
+Обработчик регистрируется декоратором handler(kind), получает задание и
+возвращает результат, который сохраняется в Job.result (JSON).
+"""
+import json
+import logging
+import tempfile
+import time
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+from deliveries import media, rollup
+from deliveries.export import STREAMERS, export_rows
+from deliveries.models import Job, JobKindEnum, JobStatusEnum
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+
+class JobError(Exception):
+    """Ошибка, которую повтор не исправит (неверные параметры): задание сразу получает failed."""
+
+
+def handler(kind):
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, params=None, user=None):
+    return Job.objects.create(
+        kind=kind,
+        params=params or {},
+        user=user,
+        max_attempts=settings.JOBS_MAX_ATTEMPTS,
+        run_after=timezone.now(),
+    )
+
+
+def claim(worker_id, limit):
+    """Забрать до limit готовых заданий; возвращает их id."""
+    table = Job._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET status = %s, attempts = attempts + 1, locked_by = %s, '
+            f'locked_at = now(), started_at = now() '
+            f'WHERE id IN ('
+            f'SELECT id FROM {table} WHERE status = %s AND run_after <= now() '
+            f'ORDER BY run_after, id LIMIT %s FOR UPDATE SKIP LOCKED'
+            f') RETURNING id',
+            [JobStatusEnum.RUNNING, worker_id, JobStatusEnum.QUEUED, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def heartbeat(job_ids):
+    Job.objects.filter(pk__in=job_ids, status=JobStatusEnum.RUNNING).update(locked_at=timezone.now())
+
+
+def requeue_stale():
+    """Задания воркеров, переставших подавать сигнал: повторить или, если попытки кончились, — failed."""
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=JobStatusEnum.RUNNING, locked_at__lt=now - timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+    )
+    released = {'error': 'Воркер перестал отвечать во время выполнения.', 'locked_by': '', 'locked_at': None}
+    stale.filter(attempts__gte=F('max_attempts')).update(status=JobStatusEnum.FAILED, finished_at=now, **released)
+    stale.filter(attempts__lt=F('max_attempts')).update(status=JobStatusEnum.QUEUED, run_after=now, **released)
+
+
+def purge_expired_exports():
+    """
+    Удалить файлы выгрузок, выполненных раньше EXPORT_RESULT_TTL_HOURS часов назад.
+    Задание остаётся в списке: в result вместо file — expired. Возвращает число удалённых файлов.
+    """
+    expired = Job.objects.filter(
+        kind=JobKindEnum.EXPORT, status=JobStatusEnum.SUCCEEDED, result__has_key='file',
+        finished_at__lt=timezone.now() - timedelta(hours=settings.EXPORT_RESULT_TTL_HOURS),
+    )
+    purged = 0
+    for job in expired.only('pk', 'result').iterator():
+        name = job.result.pop('file')
+        job.result['expired'] = True
+        # Файл удаляет тот, кто первым отметил задание (воркеров может быть несколько)
+        if Job.objects.filter(pk=job.pk, result__has_key='file').update(result=job.result):
+            default_storage.delete(name)
+            purged += 1
+    return purged
+
+
+def delete_result_file(job):
+    """Удалить файл результата вместе с заданием (после коммита удаления)."""
+    name = (job.result or {}).get('file') if job.kind == JobKindEnum.EXPORT else None
+    if name:
+        transaction.on_commit(lambda: default_storage.delete(name))
+
+
+def finish(job, **changes):
+    # Только та попытка, которую выполнял этот воркер: после requeue_stale задание мог взять другой
+    return Job.objects.filter(pk=job.pk, status=JobStatusEnum.RUNNING, attempts=job.attempts).update(
+        locked_by='', locked_at=None, **changes
+    )
+
+
+def retry_or_fail(job, error, retry=True):
+    now = timezone.now()
+    if retry and job.attempts < job.max_attempts:
+        delay = settings.JOBS_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+        finish(job, status=JobStatusEnum.QUEUED, run_after=now + timedelta(seconds=delay), error=error)
+    else:
+        finish(job, status=JobStatusEnum.FAILED, finished_at=now, error=error)
+
+
+def execute(job_id):
+    """Выполнить задание в процессе пула и записать результат или ошибку."""
+    close_old_connections()
+    job = Job.objects.select_related('user').get(pk=job_id)
+    try:
+        result = HANDLERS[job.kind](job)
+    except Exception as exc:
+        logger.exception('Job %s (%s), attempt %s/%s failed', job.pk, job.kind, job.attempts, job.max_attempts)
+        retry_or_fail(job, f'{type(exc).__name__}: {exc}', retry=not isinstance(exc, JobError))
+    else:
+        finish(job, status=JobStatusEnum.SUCCEEDED, result=result, error='', finished_at=timezone.now())
+
+
+def delivery_view(user, params):
+    """DeliveryViewSet для сохранённых параметров списка: фильтры, поиск и сортировка — как у GET /deliveries/."""
+    # deliveries.views импортирует этот модуль
+    from deliveries.views import DeliveryViewSet
+
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    http_request.GET = QueryDict(urlencode(params, doseq=True))
+    request = Request(http_request)
+    request.user = user
+    return DeliveryViewSet(request=request, format_kwarg=None, action='export', args=(), kwargs={})
+
+
+@handler(JobKindEnum.EXPORT)
+def export_deliveries(job):
+    """Выгрузка как у /deliveries/export/, но в файл хранилища; скачивается через /jobs/{id}/download/."""
+    params = dict(job.params)
+    export_format = params.pop('export_format', 'csv')
+    view = delivery_view(job.user, params)
+    try:
+        queryset = view.filter_queryset(view.get_queryset())
+    except ValidationError as exc:
+        raise JobError(json.dumps(exc.detail, ensure_ascii=False)) from exc
+
+    exported = 0
+
+    def counted(rows):
+        nonlocal exported
+        for row in rows:
+            exported += 1
+            yield row
+
+    with tempfile.TemporaryFile() as f:
+        for chunk in STREAMERS[export_format](counted(export_rows(queryset, chunk_size=view.export_chunk_size))):
+            f.write(chunk.encode())
+        size = f.tell()
+        f.seek(0)
+        name = default_storage.save(f'exports/deliveries-{job.pk}.{export_format}', File(f))
+    expires_at = timezone.now() + timedelta(hours=settings.EXPORT_RESULT_TTL_HOURS)
+    return {'file': name, 'rows': exported, 'size': size, 'expires_at': expires_at.isoformat()}
+
+
+@handler(JobKindEnum.REBUILD_SUMMARY)
+def rebuild_summary(job):
+    user_ids = None
+    if job.params.get('users'):
+        user_ids = list(
+            get_user_model().objects.filter(username__in=job.params['users']).values_list('id', flat=True)
+        )
+    started = time.perf_counter()
+    rollup.rebuild_and_bump(user_ids)
+    return {'users': None if user_ids is None else len(user_ids), 'seconds': round(time.perf_counter() - started, 2)}
+
+
+@handler(JobKindEnum.MEDIA_PREVIEW)
+def build_media_preview(job):
+    return {'preview': media.build_preview(job.params['delivery'])}
@@ -0,0 +1,175 @@
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from deliveries.benchmark import summarize
+
+SERVERS = {
+    'wsgi': {
+        'args': ['deliveries_test_task.wsgi:application'],
+        'env': {'ASYNC_API': 'False'},
+    },
+    'asgi': {
+        'args': ['deliveries_test_task.asgi:application', '--worker-class', 'uvicorn_worker.UvicornWorker'],
+        'env': {'ASYNC_API': 'True'},
+    },
+}
+DEFAULT_PATHS = ['/api/v1/deliveries/', '/api/v1/deliveries/summary/', '/api/v1/cargo/']
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнить пропускную способность gunicorn с синхронными воркерами (WSGI) и '
+        'gunicorn + uvicorn с async-представлениями (ASGI, ASYNC_API=True) при одинаковом '
+        'числе воркеров под конкурентной нагрузкой. Серверы запускаются командой на '
+        'локальном порту; пользователь должен существовать (см. benchmark_api).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', action='append', choices=sorted(SERVERS),
+                            help='Какие серверы сравнивать (по умолчанию оба).')
+        parser.add_argument('--url', help='Нагрузить уже запущенный сервер (http://host:port) вместо запуска своих.')
+        parser.add_argument('--workers', type=int, default=2, help='Воркеров gunicorn.')
+        parser.add_argument('--concurrency', type=int, default=32, help='Одновременных клиентов.')
+        parser.add_argument('--duration', type=float, default=10.0, help='Длительность замера, с.')
+        parser.add_argument('--warmup', type=float, default=2.0, help='Прогрев перед замером, с.')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--path', action='append', help=f'URL для нагрузки (по умолчанию {", ".join(DEFAULT_PATHS)}).')
+        parser.add_argument('--username', default='bench')
+        parser.add_argument('--password', default='bench-password')
+        parser.add_argument('--output', help='Путь для JSON с результатами.')
+
+    def handle(self, *args, **options):
+        paths = options['path'] or DEFAULT_PATHS
+        credentials = {'username': options['username'], 'password': options['password']}
+
+        results = {}
+        if options['url']:
+            host, port = self.parse_url(options['url'])
+            results['external'] = self.run_load(host, port, paths, credentials, options)
+        else:
+            for mode in options['mode'] or sorted(SERVERS, reverse=True):
+                server = self.start_server(mode, options['workers'], options['port'])
+                try:
+                    results[mode] = self.run_load('127.0.0.1', options['port'], paths, credentials, options)
+                finally:
+                    server.terminate()
+                    server.wait(timeout=30)
+
+        for mode, stats in results.items():
+            self.stdout.write(
+                f'{mode:<8} {stats["throughput_rps"]:>9.1f} rps  p50={stats["latency_ms"]["p50"]:>8.2f} ms  '
+                f'p95={stats["latency_ms"]["p95"]:>8.2f} ms  p99={stats["latency_ms"]["p99"]:>8.2f} ms  '
+                f'ошибок: {stats["errors"]}'
+            )
+        if options['output']:
+            report = {
+                'workers': options['workers'],
+                'concurrency': options['concurrency'],
+                'duration': options['duration'],
+                'paths': paths,
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {options["output"]}'))
+
+    def parse_url(self, url):
+        host_port = url.split('://', 1)[-1].rstrip('/')
+        host, _, port = host_port.partition(':')
+        return host, int(port or 80)
+
+    def start_server(self, mode, workers, port):
+        command = [
+            sys.executable, '-m', 'gunicorn', *SERVERS[mode]['args'],
+            '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+        ]
+        env = {**os.environ, **SERVERS[mode]['env']}
+        self.stdout.write(f'Запуск {mode}: {" ".join(command[2:])}')
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Сервер {mode} завершился с кодом {server.returncode}.')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'Сервер {mode} не начал принимать соединения за 30 с.')
+
+    def login(self, host, port, credentials):
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        conn.request('POST', '/api/v1/token/', body=json.dumps(credentials),
+                     headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        if response.status != 200:
+            raise CommandError(f'Не удалось получить токен: HTTP {response.status}')
+        cookie = SimpleCookie()
+        for header in response.msg.get_all('Set-Cookie') or []:
+            cookie.load(header)
+        return '; '.join(f'{name}={morsel.value}' for name, morsel in cookie.items())
+
+    def run_load(self, host, port, paths, credentials, options):
+        headers = {'Cookie': self.login(host, port, credentials), 'Accept': 'application/json'}
+        started = time.perf_counter()
+        measure_from = started + options['warmup']
+        deadline = measure_from + options['duration']
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def client(offset):
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            local_latencies, local_errors = [], 0
+            i = offset
+            while True:
+                request_started = time.perf_counter()
+                if request_started >= deadline:
+                    break
+                path = paths[i % len(paths)]
+                i += 1
+                try:
+                    conn.request('GET', path, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    ok = response.status < 400
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = http.client.HTTPConnection(host, port, timeout=30)
+                    ok = False
+                if request_started >= measure_from:
+                    local_latencies.append((time.perf_counter() - request_started) * 1000)
+                    local_errors += not ok
+            conn.close()
+            with lock:
+                latencies.extend(local_latencies)
+                errors.append(local_errors)
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if not latencies:
+            raise CommandError('За время замера не выполнено ни одного запроса.')
+        return {
+            'requests': len(latencies),
+            'errors': sum(errors),
+            'throughput_rps': round(len(latencies) / options['duration'], 2),
+            'latency_ms': summarize(latencies),
+        }
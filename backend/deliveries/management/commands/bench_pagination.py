@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_test_environment
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from deliveries.benchmark import measure, resolve_user
+from deliveries.models import Delivery
+from deliveries.pagination import DeliveriesCursorPagination
+from deliveries.views import DeliveryViewSet
+
+LIST_URL = '/api/v1/deliveries/'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнить время ответа /deliveries/ для первой и глубокой страницы '
+        'в режимах page-number и cursor.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Имя пользователя (по умолчанию — с наибольшим числом доставок).')
+        parser.add_argument('--page', type=int, default=5000, help='Номер глубокой страницы.')
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20, help='Количество замеров на сценарий.')
+
+    def handle(self, *args, **options):
+        user = resolve_user(options['user'])
+        page_size = options['page_size']
+        total = Delivery.objects.filter(user=user).count()
+        page = min(options['page'], max(1, total // page_size))
+        if page < options['page']:
+            self.stdout.write(self.style.WARNING(
+                f'У пользователя {user} всего {total} доставок — глубокая страница ограничена номером {page}.'
+            ))
+
+        # Разрешает хост testserver, с которым работает APIRequestFactory
+        setup_test_environment()
+        view = DeliveryViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+
+        def call(url, params):
+            def run():
+                request = factory.get(url, params)
+                force_authenticate(request, user=user)
+                response = view(request)
+                assert response.status_code == 200, response.status_code
+                response.render()
+            return run
+
+        scenarios = [
+            ('page-number, страница 1', call(LIST_URL, {'page': 1, 'page_size': page_size})),
+            (f'page-number, страница {page}', call(LIST_URL, {'page': page, 'page_size': page_size})),
+            ('cursor, страница 1', call(LIST_URL, {'pagination': 'cursor', 'page_size': page_size})),
+            (f'cursor, страница {page}', call(self.cursor_url(user, page, page_size), {})),
+        ]
+        for title, func in scenarios:
+            stats = measure(func, repeat=options['repeat'])
+            self.stdout.write(f'{title:<32} p50={stats["p50"]:>9.3f} ms  p95={stats["p95"]:>9.3f} ms')
+
+    def cursor_url(self, user, page, page_size):
+        """URL курсора, указывающего на начало страницы page (как при последовательном обходе)."""
+        if page <= 1:
+            return f'{LIST_URL}?pagination=cursor&page_size={page_size}'
+        boundary = (
+            Delivery.objects.filter(user=user)
+            .order_by('-departure_datetime', 'id')
+            .values('departure_datetime', 'id')[(page - 1) * page_size - 1]
+        )
+        paginator = DeliveriesCursorPagination()
+        paginator.base_url = f'{LIST_URL}?pagination=cursor&page_size={page_size}'
+        paginator.field_name = 'departure_datetime'
+        position = paginator._get_position_from_instance(boundary, None)
+        return paginator.encode_cursor(Cursor(offset=0, reverse=False, position=position))
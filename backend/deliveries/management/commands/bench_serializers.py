@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from deliveries.benchmark import measure, resolve_user
+from deliveries.serializers import DeliverySerializer, DeliveryRowSerializer
+from deliveries.views import DeliveryViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнить DeliverySerializer и DeliveryRowSerializer на одной странице списка: '
+        'проверить побайтовое совпадение JSON и замерить время.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Имя пользователя (по умолчанию — с наибольшим числом доставок).')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20, help='Количество замеров на сценарий.')
+
+    def handle(self, *args, **options):
+        user = resolve_user(options['user'])
+        page_size = options['page_size']
+
+        setup_test_environment()
+        request = Request(APIRequestFactory().get('/api/v1/deliveries/'))
+        request.user = user
+        view = DeliveryViewSet(request=request, format_kwarg=None, action='list')
+        queryset = view.filter_queryset(view.get_queryset())
+        context = view.get_serializer_context()
+        renderer = JSONRenderer()
+
+        def model_path():
+            page = list(queryset[:page_size])
+            return renderer.render(DeliverySerializer(page, many=True, context=context).data)
+
+        def row_path():
+            rows = queryset.prefetch_related(None).values(*DeliveryRowSerializer.values_fields)[:page_size]
+            return renderer.render(DeliveryRowSerializer(rows, many=True, context=context).data)
+
+        if model_path() != row_path():
+            raise CommandError('JSON DeliveryRowSerializer отличается от DeliverySerializer.')
+        self.stdout.write(self.style.SUCCESS('JSON совпадает побайтово.'))
+
+        model_stats = measure(model_path, repeat=options['repeat'])
+        row_stats = measure(row_path, repeat=options['repeat'])
+        for title, stats in (('DeliverySerializer', model_stats), ('DeliveryRowSerializer', row_stats)):
+            self.stdout.write(f'{title:<24} p50={stats["p50"]:>9.3f} ms  p95={stats["p95"]:>9.3f} ms')
+        self.stdout.write(f'Ускорение по p50: x{model_stats["p50"] / row_stats["p50"]:.2f}')
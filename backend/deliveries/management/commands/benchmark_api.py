@@ -0,0 +1,192 @@
+import json
+import platform
+import subprocess
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.utils import timezone
+
+from deliveries.benchmark import summarize
+from deliveries.models import Delivery, Service, CargoType
+
+User = get_user_model()
+
+API = '/api/v1'
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон API через реальные маршруты и middleware (Django test Client): '
+        'задержки p50/p95/p99, число SQL-запросов на запрос и пропускная способность. '
+        'Работает с локальной базой из настроек, внешние сервисы не нужны.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-count', type=int, default=0,
+                            help='Сначала создать столько доставок через populate_db --bulk.')
+        parser.add_argument('--seed', type=int, default=42, help='Зерно для populate_db.')
+        parser.add_argument('--workers', type=int, default=1, help='Процессы для populate_db.')
+        parser.add_argument('--username', default='bench', help='Пользователь для прогона (создаётся при отсутствии).')
+        parser.add_argument('--password', default='bench-password')
+        parser.add_argument('--requests', type=int, default=50, help='Запросов на сценарий.')
+        parser.add_argument('--warmup', type=int, default=3, help='Прогревочных запросов на сценарий.')
+        parser.add_argument('--only', action='append', metavar='SCENARIO', help='Запустить только указанные сценарии.')
+        parser.add_argument('--output', help='Путь для JSON с результатами.')
+        parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения p50/p95.')
+
+    def handle(self, *args, **options):
+        user = self.get_or_create_user(options['username'], options['password'])
+        if options['seed_count']:
+            call_command(
+                'populate_db', count=options['seed_count'], bulk=True,
+                seed=options['seed'], workers=options['workers'], stdout=self.stdout,
+            )
+
+        setup_test_environment()
+        client = Client()
+        credentials = {'username': options['username'], 'password': options['password']}
+        login = client.post(f'{API}/token/', credentials, content_type='application/json')
+        if login.status_code != 200:
+            raise CommandError(f'Не удалось получить токен: HTTP {login.status_code}')
+
+        scenarios = self.get_scenarios(user, credentials)
+        if options['only']:
+            unknown = set(options['only']) - {name for name, *_ in scenarios}
+            if unknown:
+                raise CommandError(f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+            scenarios = [scenario for scenario in scenarios if scenario[0] in options['only']]
+
+        results = {}
+        for name, method, url, data in scenarios:
+            results[name] = self.run_scenario(client, method, url, data, options['requests'], options['warmup'])
+            stats = results[name]
+            self.stdout.write(
+                f'{name:<28} p50={stats["latency_ms"]["p50"]:>8.2f} ms  '
+                f'p95={stats["latency_ms"]["p95"]:>8.2f} ms  p99={stats["latency_ms"]["p99"]:>8.2f} ms  '
+                f'queries={stats["queries"]["max"]:>3}  {stats["throughput_rps"]:>8.1f} rps'
+            )
+
+        report = {
+            'meta': self.get_meta(user),
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {options["output"]}'))
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def get_or_create_user(self, username, password):
+        user, created = User.objects.get_or_create(username=username)
+        if created or not user.check_password(password):
+            user.set_password(password)
+            user.save()
+        return user
+
+    def get_scenarios(self, user, credentials):
+        latest = Delivery.objects.filter(user=user).order_by('-departure_datetime').first()
+        date_to = timezone.localtime(latest.departure_datetime if latest else timezone.now()).date()
+        dates = {
+            'departure_datetime__gte': (date_to - timedelta(days=30)).isoformat(),
+            'departure_datetime__lte': date_to.isoformat(),
+        }
+        cargo_type = CargoType.objects.order_by('pk').values_list('pk', flat=True).first()
+        service = Service.objects.order_by('pk').values_list('pk', flat=True).first()
+        return [
+            ('token', 'post', f'{API}/token/', credentials),
+            ('deliveries', 'get', f'{API}/deliveries/', {}),
+            ('deliveries_page_size_100', 'get', f'{API}/deliveries/', {'page_size': 100}),
+            ('deliveries_filters', 'get', f'{API}/deliveries/', {**dates, 'cargo_type': cargo_type}),
+            ('deliveries_services', 'get', f'{API}/deliveries/', {'services': service}),
+            ('deliveries_search', 'get', f'{API}/deliveries/', {'search': 'А1'}),
+            ('deliveries_ordering', 'get', f'{API}/deliveries/', {'ordering': 'distance_km'}),
+            ('deliveries_cursor', 'get', f'{API}/deliveries/', {'pagination': 'cursor'}),
+            ('summary', 'get', f'{API}/deliveries/summary/', dates),
+            ('summary_services', 'get', f'{API}/deliveries/summary/', {**dates, 'services': service}),
+            ('cargo', 'get', f'{API}/cargo/', {}),
+            ('services', 'get', f'{API}/services/', {}),
+            ('packaging', 'get', f'{API}/packaging/', {}),
+        ]
+
+    def run_scenario(self, client, method, url, data, requests, warmup):
+        def call():
+            if method == 'post':
+                return client.post(url, data, content_type='application/json')
+            return client.get(url, data)
+
+        for _ in range(warmup):
+            call()
+
+        latencies = []
+        queries = []
+        statuses = {}
+        sizes = []
+        started = time.perf_counter()
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as captured:
+                request_started = time.perf_counter()
+                response = call()
+                content = b''.join(response.streaming_content) if response.streaming else response.content
+                latencies.append((time.perf_counter() - request_started) * 1000)
+            queries.append(len(captured))
+            sizes.append(len(content))
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        elapsed = time.perf_counter() - started
+
+        return {
+            'method': method.upper(),
+            'url': url,
+            'params': data if method == 'get' else {},
+            'latency_ms': summarize(latencies),
+            'queries': {'min': min(queries), 'max': max(queries), 'mean': round(sum(queries) / len(queries), 2)},
+            'response_bytes': max(sizes),
+            'throughput_rps': round(requests / elapsed, 2),
+            'status_codes': statuses,
+        }
+
+    def get_meta(self, user):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        with connection.cursor() as cursor:
+            server_version = connection.vendor
+            if connection.vendor == 'postgresql':
+                cursor.execute('SHOW server_version')
+                server_version = f'postgresql {cursor.fetchone()[0]}'
+        return {
+            'timestamp': timezone.now().isoformat(),
+            'git_commit': commit,
+            'python': platform.python_version(),
+            'database': server_version,
+            'deliveries_total': Delivery.objects.count(),
+            'deliveries_user': Delivery.objects.filter(user=user).count(),
+        }
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)['scenarios']
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Сравнение с {path}'))
+        for name, stats in results.items():
+            if name not in baseline:
+                continue
+            for metric in ('p50', 'p95'):
+                before = baseline[name]['latency_ms'][metric]
+                after = stats['latency_ms'][metric]
+                change = (after - before) / before * 100 if before else 0.0
+                style = self.style.ERROR if change > 10 else self.style.SUCCESS if change < -10 else str
+                self.stdout.write(style(f'{name:<28} {metric}: {before:>8.2f} → {after:>8.2f} ms ({change:+.1f}%)'))
+            before_queries = baseline[name]['queries']['max']
+            if stats['queries']['max'] != before_queries:
+                self.stdout.write(self.style.WARNING(
+                    f'{name:<28} запросов: {before_queries} → {stats["queries"]["max"]}'
+                ))
@@ -0,0 +1,115 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from deliveries.benchmark import resolve_user
+from deliveries.models import Delivery
+from deliveries.views import DeliveryViewSet
+
+LIST_URL = '/api/v1/deliveries/'
+SUMMARY_URL = '/api/v1/deliveries/summary/'
+# Таблицы, по которым не должно быть последовательного сканирования
+CHECKED_TABLES = ('deliveries_delivery', 'deliveries_delivery_services')
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполнить запросы списка, фильтров и summary через DeliveryViewSet, '
+        'снять EXPLAIN с каждого SQL-запроса и проверить, что по таблицам '
+        'доставок нет Seq Scan. Показательно на больших таблицах (миллионы строк): '
+        'на маленьких планировщик законно предпочитает последовательное чтение.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Имя пользователя (по умолчанию — с наибольшим числом доставок).')
+        parser.add_argument('--days', type=int, default=7, help='Ширина диапазона дат для фильтров.')
+        parser.add_argument('--analyze', action='store_true', help='Использовать EXPLAIN ANALYZE.')
+        parser.add_argument('--verbose-plans', action='store_true', help='Печатать планы целиком.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов поддерживается только для PostgreSQL.')
+
+        user = resolve_user(options['user'])
+        latest = Delivery.objects.filter(user=user).order_by('-departure_datetime').first()
+        if latest is None:
+            raise CommandError(f'У пользователя {user} нет доставок.')
+        date_to = timezone.localtime(latest.departure_datetime).date()
+        date_from = date_to - timedelta(days=options['days'])
+        dates = {
+            'departure_datetime__gte': date_from.isoformat(),
+            'departure_datetime__lte': date_to.isoformat(),
+        }
+        cargo_type_id = latest.cargo_type_id
+        service_id = latest.services.values_list('id', flat=True).first()
+
+        scenarios = [
+            ('list', LIST_URL, {}, 'list'),
+            ('list, ordering=distance_km', LIST_URL, {'ordering': 'distance_km'}, 'list'),
+            ('list, cursor', LIST_URL, {'pagination': 'cursor'}, 'list'),
+            ('list, даты', LIST_URL, dates, 'list'),
+            ('list, даты + cargo_type', LIST_URL, {**dates, 'cargo_type': cargo_type_id}, 'list'),
+            ('list, services', LIST_URL, {'services': service_id}, 'list'),
+            ('summary', SUMMARY_URL, dates, 'summary_by_day'),
+            ('summary, cargo_type', SUMMARY_URL, {**dates, 'cargo_type': cargo_type_id}, 'summary_by_day'),
+            ('summary, services', SUMMARY_URL, {**dates, 'services': service_id}, 'summary_by_day'),
+        ]
+
+        setup_test_environment()
+        factory = APIRequestFactory()
+        failures = []
+        for title, url, params, action in scenarios:
+            params = {key: value for key, value in params.items() if value is not None}
+            request = factory.get(url, params)
+            force_authenticate(request, user=user)
+            view = DeliveryViewSet.as_view({'get': action})
+
+            captured = []
+            with connection.execute_wrapper(self.capture(captured)):
+                response = view(request)
+                response.render()
+            if response.status_code != 200:
+                failures.append(title)
+                self.stderr.write(self.style.ERROR(f'{title}: HTTP {response.status_code}'))
+                continue
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{title}'))
+            for sql, sql_params in captured:
+                if not any(table in sql for table in CHECKED_TABLES):
+                    continue
+                plan = self.explain(sql, sql_params, options['analyze'])
+                seq_scans = [
+                    line.strip() for line in plan
+                    if 'Seq Scan on' in line and any(f'on {table} ' in f'{line} ' for table in CHECKED_TABLES)
+                ]
+                status = self.style.ERROR('SEQ SCAN') if seq_scans else self.style.SUCCESS('OK')
+                self.stdout.write(f'  [{status}] {plan[0].strip()}')
+                for line in seq_scans:
+                    self.stdout.write(f'      {line}')
+                if options['verbose_plans']:
+                    self.stdout.write('\n'.join(f'      {line}' for line in plan))
+                if seq_scans:
+                    failures.append(title)
+
+        if failures:
+            raise CommandError(f'Последовательное сканирование в сценариях: {", ".join(sorted(set(failures)))}')
+        self.stdout.write(self.style.SUCCESS('Все запросы используют индексы.'))
+
+    @staticmethod
+    def capture(captured):
+        def wrapper(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                captured.append((sql, params))
+            return execute(sql, params, many, context)
+        return wrapper
+
+    @staticmethod
+    def explain(sql, params, analyze):
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return [row[0] for row in cursor.fetchall()]
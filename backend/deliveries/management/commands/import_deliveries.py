@@ -0,0 +1,314 @@
+import csv
+import gzip
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from deliveries import ingest, rollup, versions
+from deliveries.export import SERVICES_SEPARATOR
+from deliveries.models import CargoType, Delivery, PackagingType, Service, TransportModel
+
+User = get_user_model()
+
+FORMATS_BY_EXTENSION = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+STAGING_TABLE = 'delivery_import_staging'
+# Порядок столбцов COPY; id заполняется значением по умолчанию — из последовательности Delivery
+STAGING_COLUMNS = (
+    'plate_number', 'departure_datetime', 'arrival_datetime', 'distance_km', 'status',
+    'technical_state', 'packaging_id', 'cargo_type_id', 'service_ids',
+)
+# Справочники и поле названия: таблицы «id или название → id» загружаются до запуска пула
+REFERENCES = ((PackagingType, 'title'), (CargoType, 'name'), (Service, 'name'))
+ERRORS_SHOWN = 10
+
+
+def open_text(path):
+    """Текстовый поток файла; gzip распознаётся по сигнатуре и распаковывается на лету."""
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    if compressed:
+        return gzip.open(path, 'rt', encoding='utf-8-sig', newline='')
+    return open(path, encoding='utf-8-sig', newline='')
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return FORMATS_BY_EXTENSION.get(os.path.splitext(name)[1].lower())
+
+
+def csv_record(header, values):
+    """Строка CSV в объект для ingest.parse_row: колонки как в выгрузке /deliveries/export/."""
+    if len(values) != len(header):
+        return ingest.MalformedLine(f'Ожидается колонок: {len(header)}, получено: {len(values)}.')
+    record = dict(zip(header, values))
+    for name in ('packaging', 'cargo_type'):
+        if record.get(name, '').isdigit():
+            record[name] = int(record[name])
+    if 'services' in record:
+        record['services'] = [
+            int(service) if service.isdigit() else service
+            for service in (part.strip() for part in record['services'].split(SERVICES_SEPARATOR.strip()))
+            if service
+        ]
+    return record
+
+
+def ndjson_record(line):
+    try:
+        return json.loads(line)
+    except ValueError as exc:
+        return ingest.MalformedLine(f'Некорректный JSON: {exc}.')
+
+
+def copy_line(values, plate, service_ids):
+    """Строка для COPY в текстовом формате. Значения проверены parse_row, экранировать нечего."""
+    cargo_type = r'\N' if values['cargo_type_id'] is None else values['cargo_type_id']
+    return (
+        f'{plate}\t{values["departure_datetime"].isoformat()}\t{values["arrival_datetime"].isoformat()}\t'
+        f'{values["distance_km"]}\t{values["status"]}\t{values["technical_state"]}\t'
+        f'{values["packaging_id"]}\t{cargo_type}\t{{{",".join(map(str, service_ids))}}}\n'
+    )
+
+
+def parse_chunk(task):
+    """
+    Разобрать и проверить порцию записей в процессе пула. Справочники — из таблиц,
+    загруженных до запуска пула (к БД процесс обращается, только если ссылки в них нет).
+    Возвращает (данные для COPY, число строк в них, ошибки, номер записи после порции).
+    """
+    file_format, header, first_index, records = task
+    parsed = []
+    errors = []
+    for index, record in enumerate(records, first_index):
+        raw = csv_record(header, record) if file_format == 'csv' else ndjson_record(record)
+        row, row_errors = ingest.parse_row(raw)
+        if row_errors:
+            errors.append({'index': index, 'errors': row_errors})
+        else:
+            parsed.append((index, row))
+    valid = ingest.resolve_references(parsed, errors) if parsed else []
+    return ''.join(copy_line(*row) for _, row in valid), len(valid), errors, first_index + len(records)
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортировать доставки пользователя из файла CSV или NDJSON (в том числе .gz) '
+        'в формате выгрузки /deliveries/export/ или POST /deliveries/bulk/. Файл читается '
+        'потоком, записи разбираются в пуле процессов, порции загружаются через COPY во '
+        'временную таблицу и переносятся в Delivery и связи с услугами. После каждой порции '
+        'пишется чекпойнт: повторный запуск продолжает с места остановки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .csv, .ndjson или .jsonl, можно сжатый gzip (.gz).')
+        parser.add_argument('--user', required=True, help='Владелец импортируемых доставок (username).')
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='Формат файла, если его не определить по расширению.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Процессов для разбора и проверки записей.')
+        parser.add_argument('--chunk-size', type=int, default=20000,
+                            help='Записей в порции: порция загружается одной транзакцией.')
+        parser.add_argument('--checkpoint', help='Файл чекпойнта (по умолчанию <path>.checkpoint).')
+        parser.add_argument('--restart', action='store_true', help='Не продолжать по чекпойнту, начать заново.')
+        parser.add_argument('--errors', help='Записывать отклонённые записи с ошибками в этот файл (NDJSON).')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+        if file_format is None:
+            raise CommandError('Не удалось определить формат по расширению, укажите --format.')
+        user = User.objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError(f'Пользователь {options["user"]} не найден.')
+        workers = max(1, options['workers'])
+        chunk_size = max(1, options['chunk_size'])
+
+        stat = os.stat(path)
+        self.checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        self.source = {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                       'user': user.pk}
+        self.checkpoint = {'records': 0, 'errors_offset': None}
+        done = 0 if options['restart'] else self.load_checkpoint()
+        if done:
+            self.stdout.write(f'Продолжение с записи {done} по чекпойнту {self.checkpoint_path}.')
+
+        for model, name_field in REFERENCES:
+            ingest.reference_lookup(model, name_field, set())
+        # Дочерние процессы не должны наследовать открытые соединения и пул
+        # (потоки пула psycopg после fork не работают)
+        connections.close_all()
+        for db in connections.all():
+            db.close_pool()
+
+        self.staging_ready = False
+        self.rejected = 0
+        errors_file = self.errors_file = None
+        if options['errors']:
+            errors_file = self.errors_file = open(options['errors'], 'a' if done else 'w', encoding='utf-8')
+            if done and self.checkpoint['errors_offset'] is not None:
+                # Ошибки порций, не дошедших до коммита, записаны до сбоя и будут записаны снова
+                errors_file.truncate(self.checkpoint['errors_offset'])
+                errors_file.seek(0, os.SEEK_END)
+        started = time.perf_counter()
+        imported = 0
+        try:
+            with open_text(path) as f, multiprocessing.get_context('fork').Pool(workers) as pool:
+                reader = csv.reader(f) if file_format == 'csv' else (line for line in f if line.strip())
+                header = [name.strip() for name in next(reader, [])] if file_format == 'csv' else None
+                # Уже загруженные записи пропускаются без разбора
+                next(islice(reader, done, done), None)
+                tasks = (
+                    (file_format, header, first_index, records)
+                    for first_index, records in self.chunks(reader, done, chunk_size)
+                )
+                # Порции разбираются впереди загрузки, но не больше 2 на процесс — память ограничена
+                pending = deque(pool.apply_async(parse_chunk, (task,)) for task in islice(tasks, workers * 2))
+                while pending:
+                    data, rows, errors, end = pending.popleft().get()
+                    task = next(tasks, None)
+                    if task is not None:
+                        pending.append(pool.apply_async(parse_chunk, (task,)))
+                    # Ошибки пишутся до коммита порции: смещение после них входит в её чекпойнт
+                    self.report_errors(errors, errors_file)
+                    imported += self.load_chunk(data, rows, user.pk, end)
+                    rate = (end - done) / (time.perf_counter() - started)
+                    self.stdout.write(f'\rОбработано записей {end}, загружено {imported} ({rate:.0f} записей/с)',
+                                      ending='')
+                    self.stdout.flush()
+        finally:
+            if errors_file is not None:
+                errors_file.close()
+        self.stdout.write('')
+
+        self.save_checkpoint({**self.checkpoint, 'finished': True})
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено доставок: {imported}, отклонено записей: {self.rejected} за {elapsed:.1f} с.'
+        ))
+
+    @staticmethod
+    def chunks(reader, first_index, size):
+        while records := list(islice(reader, size)):
+            yield first_index, records
+            first_index += len(records)
+
+    def load_checkpoint(self):
+        """Сколько записей уже загружено по чекпойнту (0 — чекпойнта нет)."""
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return 0
+        if checkpoint.get('source') != self.source:
+            raise CommandError(f'Чекпойнт {self.checkpoint_path} относится к другому файлу или пользователю; '
+                               f'--restart начнёт импорт заново.')
+        if checkpoint.get('finished'):
+            raise CommandError(f'Файл уже импортирован (чекпойнт {self.checkpoint_path}); '
+                               f'--restart импортирует его ещё раз.')
+        pending = checkpoint.get('pending')
+        if pending:
+            # Процесс мог остановиться между коммитом порции и записью чекпойнта:
+            # закоммичена ли она, знает сама БД
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_xact_status(%s::xid8)', [pending['xid']])
+                if cursor.fetchone()[0] == 'committed':
+                    checkpoint['records'] = pending['records']
+                    checkpoint['errors_offset'] = pending.get('errors_offset')
+        self.checkpoint = {'records': checkpoint['records'], 'errors_offset': checkpoint.get('errors_offset')}
+        return checkpoint['records']
+
+    def save_checkpoint(self, state):
+        self.checkpoint = state
+        # Через временный файл: оборванная запись не портит прежний чекпойнт
+        temporary = f'{self.checkpoint_path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'source': self.source, **state}, f)
+        os.replace(temporary, self.checkpoint_path)
+
+    def ensure_staging(self, cursor):
+        if self.staging_ready:
+            return
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [Delivery._meta.db_table, 'id'])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} ('
+            f'id bigint NOT NULL DEFAULT nextval(%s), plate_number varchar(6) NOT NULL, '
+            f'departure_datetime timestamptz NOT NULL, arrival_datetime timestamptz NOT NULL, '
+            f'distance_km numeric(7, 2) NOT NULL, status varchar(20) NOT NULL, technical_state varchar(3) NOT NULL, '
+            f'packaging_id bigint NOT NULL, cargo_type_id bigint, service_ids bigint[] NOT NULL'
+            f') ON COMMIT DELETE ROWS',
+            [sequence],
+        )
+        self.staging_ready = True
+
+    def errors_offset(self):
+        """Размер файла ошибок (--errors) после уже записанных ошибок; None — файла нет."""
+        if self.errors_file is None:
+            return None
+        self.errors_file.flush()
+        return self.errors_file.tell()
+
+    def load_chunk(self, data, rows, user_id, end):
+        """Загрузить порцию: COPY во временную таблицу и перенос в Delivery одной транзакцией."""
+        errors_offset = self.errors_offset()
+        if not rows:
+            self.save_checkpoint({'records': end, 'errors_offset': errors_offset})
+            return 0
+
+        deliveries = Delivery._meta.db_table
+        through = Delivery.services.through._meta.db_table
+        transports = TransportModel._meta.db_table
+        # Столбцы, которые переносятся как есть: без номера транспорта и услуг
+        columns = STAGING_COLUMNS[1:-1]
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                self.ensure_staging(cursor)
+                with cursor.cursor.copy(f'COPY {STAGING_TABLE} ({", ".join(STAGING_COLUMNS)}) FROM STDIN') as copy:
+                    copy.write(data)
+                # Новые номера транспорта создаются одним запросом, сигналы о них не нужны:
+                # в ответах по доставкам их ещё нет
+                cursor.execute(
+                    f'INSERT INTO {transports} (plate_number) '
+                    f'SELECT DISTINCT plate_number FROM {STAGING_TABLE} '
+                    f'ON CONFLICT (plate_number) DO NOTHING'
+                )
+                cursor.execute(
+                    f'INSERT INTO {deliveries} '
+                    f'(id, transport_model_id, {", ".join(columns)}, user_id, media_file, media_preview) '
+                    f'SELECT s.id, t.id, {", ".join(f"s.{column}" for column in columns)}, %s, %s, %s '
+                    f'FROM {STAGING_TABLE} s JOIN {transports} t ON t.plate_number = s.plate_number',
+                    [user_id, '', ''],
+                )
+                cursor.execute(
+                    f'INSERT INTO {through} (delivery_id, service_id) '
+                    f'SELECT id, unnest(service_ids) FROM {STAGING_TABLE}'
+                )
+                # Сигналов нет: сводку и версию данных обновляем явно
+                rollup.add_staged(STAGING_TABLE, user_id)
+                versions.bump([user_id])
+                cursor.execute('SELECT pg_current_xact_id()::text')
+                xid = cursor.fetchone()[0]
+            # Записывается до коммита: load_checkpoint по xid узнает, дошла ли порция до коммита
+            self.save_checkpoint({
+                **self.checkpoint,
+                'pending': {'records': end, 'xid': xid, 'errors_offset': errors_offset},
+            })
+        self.save_checkpoint({'records': end, 'errors_offset': errors_offset})
+        return rows
+
+    def report_errors(self, errors, errors_file):
+        for error in sorted(errors, key=lambda error: error['index']):
+            self.rejected += 1
+            if errors_file is not None:
+                errors_file.write(json.dumps(error, ensure_ascii=False) + '\n')
+            elif self.rejected <= ERRORS_SHOWN:
+                self.stderr.write(f'\nЗапись {error["index"]}: {json.dumps(error["errors"], ensure_ascii=False)}')
+        if errors_file is None and self.rejected > ERRORS_SHOWN and self.rejected - len(errors) <= ERRORS_SHOWN:
+            self.stderr.write('\nОстальные ошибки не показаны; --errors запишет все в файл.')
@@ -1,9 +1,13 @@
+import multiprocessing
 import random
-from datetime import timedelta
+import time
+from datetime import date, datetime, time as dt_time, timedelta
 from django.core.management.base import BaseCommand
+from django.db import connections, transaction
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
+from deliveries import rollup
 from deliveries.models import TransportModel, PackagingType, Service, CargoType
 from deliveries.models import Delivery, DeliveryStatusEnum
 
@@ -30,6 +34,61 @@ DEFAULT_CARGO_TYPES = [
 
 # Для генерации случайного номера по ГОСТ
 PLATE_LETTERS = 'АВЕКМНОРСТУХ'
+# Точка отсчёта дат при --seed без --base-date: с текущим временем данные зависели бы от дня запуска
+SEED_BASE_DATE = date(2025, 6, 1)
+
+
+def random_plate(rng=random):
+    return (
+            rng.choice(PLATE_LETTERS)
+            + ''.join(rng.choice('0123456789') for _ in range(3))
+            + ''.join(rng.choice(PLATE_LETTERS) for _ in range(2))
+    )
+
+
+def create_batch(batch_index, size, seed, refs, base_time):
+    """
+    Сгенерировать и вставить одну пачку доставок вместе со связями услуг.
+    Пачка генерируется собственным генератором от (seed, batch_index), поэтому
+    набор данных не зависит ни от числа процессов, ни от порядка их работы.
+    """
+    rng = random.Random(f'{seed}-{batch_index}') if seed is not None else random.Random()
+    deliveries = []
+    chosen_services = []
+    for _ in range(size):
+        departure = base_time - timedelta(days=rng.randint(0, 90), hours=rng.randint(0, 23))
+        arrival = departure + timedelta(hours=rng.randint(1, 48), minutes=rng.randint(0, 59))
+        deliveries.append(Delivery(
+            transport_model_id=rng.choice(refs['transports']),
+            departure_datetime=departure,
+            arrival_datetime=arrival,
+            distance_km=round(rng.uniform(1.0, 3000.0), 2),
+            media_file=None,
+            status=rng.choice(refs['statuses']),
+            packaging_id=rng.choice(refs['packages']),
+            cargo_type_id=rng.choice(refs['cargo_types']),
+            technical_state=rng.choice(['ok', 'nok']),
+            user_id=rng.choice(refs['users']),
+        ))
+        services = refs['services']
+        chosen_services.append(rng.sample(services, k=rng.randint(1, min(3, len(services)))))
+
+    through = Delivery.services.through
+    with transaction.atomic():
+        Delivery.objects.bulk_create(deliveries, batch_size=size)
+        through.objects.bulk_create(
+            [
+                through(delivery_id=delivery.pk, service_id=service_id)
+                for delivery, service_ids in zip(deliveries, chosen_services)
+                for service_id in service_ids
+            ],
+            batch_size=size * 3,
+        )
+    return size
+
+
+def _create_batch_star(args):
+    return create_batch(*args)
 
 
 class Command(BaseCommand):
@@ -40,18 +99,43 @@ class Command(BaseCommand):
             '--count', type=int, default=100,
             help='Количество доставок для создания.'
         )
+        parser.add_argument(
+            '--bulk', action='store_true',
+            help='Массовая вставка пачками через bulk_create (для больших объёмов).'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=None,
+            help='Зерно генератора случайных чисел для воспроизводимых данных.'
+        )
+        parser.add_argument(
+            '--base-date', type=date.fromisoformat, default=None,
+            help='Дата (ГГГГ-ММ-ДД), от которой отсчитываются 90 дней отправлений. '
+                 f'По умолчанию — текущее время, с --seed — {SEED_BASE_DATE.isoformat()}.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Размер пачки в режиме --bulk.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Количество параллельных процессов в режиме --bulk.'
+        )
 
     def handle(self, *args, **options):
         count = options['count']
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+        base_date = options['base_date'] or (SEED_BASE_DATE if options['seed'] is not None else None)
+        if base_date is None:
+            base_time = timezone.now().replace(minute=0, second=0, microsecond=0)
+        else:
+            base_time = timezone.make_aware(datetime.combine(base_date, dt_time.min))
 
         # Создаём или получаем записи справочников
-        for _ in range(1000):
-            plate = (
-                    random.choice(PLATE_LETTERS)
-                    + ''.join(random.choice('0123456789') for _ in range(3))
-                    + ''.join(random.choice(PLATE_LETTERS) for _ in range(2))
-            )
-            TransportModel.objects.get_or_create(plate_number=plate)
+        TransportModel.objects.bulk_create(
+            [TransportModel(plate_number=random_plate()) for _ in range(1000)],
+            ignore_conflicts=True
+        )
         for title in DEFAULT_PACKAGINGS:
             PackagingType.objects.get_or_create(title=title)
         for svc in DEFAULT_SERVICES:
@@ -59,11 +143,11 @@ class Command(BaseCommand):
         for ctype in DEFAULT_CARGO_TYPES:
             CargoType.objects.get_or_create(name=ctype)
 
-        transports = list(TransportModel.objects.all())
-        services = list(Service.objects.all())
-        packages = list(PackagingType.objects.all())
-        cargo_types = list(CargoType.objects.all()) or [None]
-        users = list(User.objects.filter(is_active=True))
+        transports = list(TransportModel.objects.order_by('pk'))
+        services = list(Service.objects.order_by('pk'))
+        packages = list(PackagingType.objects.order_by('pk'))
+        cargo_types = list(CargoType.objects.order_by('pk')) or [None]
+        users = list(User.objects.filter(is_active=True).order_by('pk'))
         statuses = [choice[0] for choice in DeliveryStatusEnum.choices]
 
         if not (transports and services and packages and users):
@@ -72,9 +156,21 @@ class Command(BaseCommand):
             ))
             return
 
+        if options['bulk']:
+            refs = {
+                'transports': [obj.pk for obj in transports],
+                'services': [obj.pk for obj in services],
+                'packages': [obj.pk for obj in packages],
+                'cargo_types': [obj.pk if obj else None for obj in cargo_types],
+                'users': [obj.pk for obj in users],
+                'statuses': statuses,
+            }
+            self.bulk_populate(count, refs, base_time, options)
+            return
+
         for _ in range(count):
             transport_model = random.choice(transports)
-            departure = timezone.now() - timedelta(days=random.randint(0, 90), hours=random.randint(0, 23))
+            departure = base_time - timedelta(days=random.randint(0, 90), hours=random.randint(0, 23))
             arrival = departure + timedelta(hours=random.randint(1, 48), minutes=random.randint(0, 59))
 
             delivery = Delivery.objects.create(
@@ -95,3 +191,38 @@ class Command(BaseCommand):
             self.stdout.write(f'\rСоздана доставка #{delivery.id}')
 
         self.stdout.write(self.style.SUCCESS(f'Успешно создано {count} доставок.'))
+
+    def bulk_populate(self, count, refs, base_time, options):
+        batch_size = max(1, options['batch_size'])
+        workers = max(1, options['workers'])
+        batches = [
+            (index, min(batch_size, count - start), options['seed'], refs, base_time)
+            for index, start in enumerate(range(0, count, batch_size))
+        ]
+
+        started = time.perf_counter()
+        if workers == 1:
+            results = map(_create_batch_star, batches)
+            self.report_progress(results, count, started)
+        else:
+            # Дочерние процессы не должны наследовать открытые соединения и пул
+            # (потоки пула psycopg после fork не работают)
+            connections.close_all()
+            for connection in connections.all():
+                connection.close_pool()
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                self.report_progress(pool.imap_unordered(_create_batch_star, batches), count, started)
+
+        # bulk_create не отправляет сигналы: сводку и версии данных обновляем явно
+        rollup.rebuild_and_bump(refs['users'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Успешно создано {count} доставок за {elapsed:.1f} с.'))
+
+    def report_progress(self, results, count, started):
+        created = 0
+        for size in results:
+            created += size
+            rate = created / (time.perf_counter() - started)
+            self.stdout.write(f'\rСоздано {created}/{count} ({rate:.0f} строк/с)', ending='')
+            self.stdout.flush()
+        self.stdout.write('')
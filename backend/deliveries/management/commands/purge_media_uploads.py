@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from deliveries import media
+from deliveries.models import MediaUpload
+
+
+class Command(BaseCommand):
+    help = (
+        'Удалить брошенные загрузки медиафайлов: без новых частей дольше '
+        'MEDIA_UPLOAD_EXPIRE_HOURS часов или так и не прикреплённые к доставке. '
+        'Запускать по расписанию (cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.MEDIA_UPLOAD_EXPIRE_HOURS,
+                            help='Через сколько часов без изменений загрузка считается брошенной.')
+
+    def handle(self, *args, **options):
+        expired = MediaUpload.objects.filter(updated_at__lt=timezone.now() - timedelta(hours=options['hours']))
+        purged = 0
+        for upload in expired.iterator():
+            media.discard(upload)
+            purged += 1
+        self.stdout.write(self.style.SUCCESS(f'Удалено загрузок: {purged}.'))
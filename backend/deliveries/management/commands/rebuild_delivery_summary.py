@@ -0,0 +1,30 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from deliveries import rollup
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать дневную сводку доставок (DeliveryDailySummary) по сырым данным.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='users', metavar='USERNAME',
+            help='Пересобрать только для указанных пользователей (можно повторять).'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['users']:
+            user_ids = list(User.objects.filter(username__in=options['users']).values_list('id', flat=True))
+            if len(user_ids) != len(set(options['users'])):
+                raise CommandError('Часть пользователей не найдена.')
+
+        started = time.perf_counter()
+        rollup.rebuild_and_bump(user_ids)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Сводка пересобрана за {elapsed:.2f} с.'))
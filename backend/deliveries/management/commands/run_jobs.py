@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from deliveries import jobs
+from deliveries.models import Job
+from deliveries.worker import init_worker
+
+# Как часто (с) воркер удаляет просроченные файлы выгрузок
+PURGE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Воркер фоновых заданий (выгрузки, пересборка сводки, превью): забирает задания из '
+        'таблицы Job и выполняет их в пуле процессов. SIGTERM или Ctrl+C — дождаться текущих '
+        'заданий и выйти. Воркеров можно запускать несколько, в том числе на разных машинах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.JOBS_WORKER_PROCESSES,
+                            help='Сколько заданий выполнять одновременно.')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOBS_POLL_INTERVAL,
+                            help='Пауза между опросами пустой очереди, с.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Выполнить готовые задания и выйти, когда очередь опустеет.')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        poll_interval = options['poll_interval']
+        if processes < 1:
+            raise CommandError('Нужно --processes >= 1.')
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.stdout.write(f'Воркер {worker_id}: процессов {processes}.')
+
+        pool = self.start_pool(processes)
+        running = {}
+        done_count = 0
+        purged_at = 0
+        try:
+            while True:
+                if not self.stopping:
+                    jobs.requeue_stale()
+                    if time.monotonic() - purged_at >= PURGE_INTERVAL:
+                        jobs.purge_expired_exports()
+                        purged_at = time.monotonic()
+                    for job_id in jobs.claim(worker_id, processes - len(running)):
+                        running[pool.submit(jobs.execute, job_id)] = job_id
+                if not running:
+                    if self.stopping or options['burst']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                jobs.heartbeat(list(running.values()))
+                done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                    # Процесс пула погиб (например, OOM killer): пул непригоден, а все его
+                    # задания завершаются этой же ошибкой — собираем их и запускаем новый пул
+                    done = set(running)
+                    wait(done)
+                    pool.shutdown(wait=False)
+                    pool = self.start_pool(processes)
+                for future in done:
+                    job_id = running.pop(future)
+                    done_count += 1
+                    error = future.exception()
+                    if error is not None:
+                        # Задание не успело записать результат
+                        jobs.retry_or_fail(Job.objects.get(pk=job_id), f'{type(error).__name__}: {error}')
+        finally:
+            pool.shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS(f'Воркер {worker_id} остановлен, обработано заданий: {done_count}.'))
+
+    def start_pool(self, processes):
+        # spawn: fork процесса с открытыми соединениями БД и потоками небезопасен
+        return ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+        )
+
+    def stop(self, signum, frame):
+        if not self.stopping:
+            self.stdout.write('Остановка: новые задания не берутся, ждём текущие.')
+        self.stopping = True
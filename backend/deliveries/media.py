@@ -0,0 +1,480 @@
+"""
+Загрузка медиафайлов доставок по частям и построение превью.
+
+Клиент создаёт загрузку (POST /uploads/ с именем и размером файла) и отправляет
+байты запросами PUT /uploads/{id}/ с заголовком Content-Range. Тело читается
+потоком блоками по CHUNK_SIZE и дописывается во временный файл, поэтому память
+не зависит от размера файла. После обрыва клиент узнаёт принятый объём
+(GET /uploads/{id}/, поле received) и продолжает с него. Тип содержимого
+проверяется по сигнатуре, как только приняты первые байты, размер — по
+заявленному при создании загрузки.
+
+Готовая загрузка прикрепляется к доставке (POST /deliveries/{id}/media/).
+Превью изображения строится после коммита в пуле потоков процесса
+(MEDIA_PREVIEW_WORKERS) или заданием очереди (MEDIA_PREVIEW_QUEUE), а не
+в запросе; для PDF превью не строится.
+
+Файлы отдаются только владельцу доставки (serve): после проверки доступа
+передача поручается прокси (X-Accel-Redirect для nginx, X-Sendfile), а без
+него — FileResponse, который gunicorn отправляет через sendfile без чтения
+в Python. Поддерживаются Range (один диапазон) и условные запросы.
+"""
+import logging
+import mimetypes
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.utils import OperationalError
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from PIL import Image, ImageOps
+from rest_framework.exceptions import APIException, UnsupportedMediaType, ValidationError
+
+from deliveries import versions
+from deliveries.models import Delivery, JobKindEnum, MediaUpload, MediaUploadStatusEnum
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+# Типы по расширению имени файла и их сигнатуры (первые байты содержимого)
+EXTENSION_TYPES = {
+    'pdf': 'application/pdf',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+}
+SIGNATURES = {
+    'application/pdf': b'%PDF-',
+    'image/jpeg': b'\xff\xd8\xff',
+    'image/png': b'\x89PNG\r\n\x1a\n',
+}
+HEAD_SIZE = max(len(signature) for signature in SIGNATURES.values())
+PREVIEW_TYPES = {'image/jpeg', 'image/png'}
+
+
+class UploadConflict(APIException):
+    status_code = 409
+    default_detail = 'Часть не совпадает с принятым объёмом загрузки.'
+    default_code = 'upload_conflict'
+
+    def __init__(self, detail=None, code=None, received=None):
+        super().__init__(detail, code)
+        if received is not None:
+            # Значения detail APIException приводит к строкам, а клиенту нужно число
+            self.detail = {'detail': self.detail, 'received': received}
+
+
+def extension_type(filename):
+    """Тип содержимого по расширению имени файла или None, если формат не поддерживается."""
+    return EXTENSION_TYPES.get(filename.rpartition('.')[2].lower()) if '.' in filename else None
+
+
+def detect_content_type(head):
+    for content_type, signature in SIGNATURES.items():
+        if head.startswith(signature):
+            return content_type
+    return 'application/octet-stream'
+
+
+def temp_path(upload):
+    return os.path.join(settings.MEDIA_UPLOAD_TEMP_DIR, f'{upload.pk}.part')
+
+
+def parse_content_range(header):
+    """(start, end, total) из «bytes start-end/total»; end включительно, как в HTTP."""
+    unit, _, spec = (header or '').partition(' ')
+    byte_range, _, total = spec.partition('/')
+    start, _, end = byte_range.partition('-')
+    try:
+        start, end, total = int(start), int(end), int(total)
+    except ValueError:
+        raise ValidationError({'Content-Range': 'Ожидается заголовок вида «bytes 0-1048575/5242880».'})
+    if unit != 'bytes' or not 0 <= start <= end < total:
+        raise ValidationError({'Content-Range': 'Некорректный диапазон.'})
+    return start, end, total
+
+
+def write_range(path, stream, start, length, heartbeat):
+    """
+    Записать length байт из потока с позиции start и отрезать хвост прерванной
+    прошлой попытки; heartbeat() вызывается после каждого блока.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining:
+            block = stream.read(min(CHUNK_SIZE, remaining))
+            if not block:
+                raise ValidationError('Тело запроса короче, чем указано в Content-Range.')
+            f.write(block)
+            remaining -= len(block)
+            heartbeat()
+        f.truncate()
+
+
+def lock_upload(upload):
+    """Строка загрузки под FOR UPDATE NOWAIT — только внутри короткой транзакции."""
+    try:
+        return MediaUpload.objects.select_for_update(nowait=True).get(pk=upload.pk)
+    except OperationalError:
+        raise UploadConflict('Другая часть этой загрузки ещё принимается.')
+    except MediaUpload.DoesNotExist:
+        raise Http404
+
+
+def claim_upload(upload, start, total):
+    """
+    Закрепить загрузку за этим запросом (метка claimed_by) на время приёма части
+    с байта start. Чужая метка, сигнал которой старше MEDIA_UPLOAD_CLAIM_SECONDS,
+    считается брошенной (процесс упал).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        upload = lock_upload(upload)
+        if upload.claimed_by and upload.claimed_at > now - timedelta(seconds=settings.MEDIA_UPLOAD_CLAIM_SECONDS):
+            raise UploadConflict('Другая часть этой загрузки ещё принимается.')
+        if total != upload.size:
+            raise ValidationError({'Content-Range': f'Размер файла при создании загрузки — {upload.size} байт.'})
+        if upload.status == MediaUploadStatusEnum.COMPLETE or start != upload.received:
+            raise UploadConflict(f'Ожидается часть с байта {upload.received}.', received=upload.received)
+        upload.claimed_by = uuid.uuid4().hex
+        upload.claimed_at = now
+        upload.save(update_fields=['claimed_by', 'claimed_at'])
+    return upload
+
+
+def claim_heartbeat(upload):
+    """
+    heartbeat для write_range: раз в четверть MEDIA_UPLOAD_CLAIM_SECONDS продлевает
+    метку отдельным коротким UPDATE. Если метку уже перехватили, приём прерывается.
+    """
+    interval = settings.MEDIA_UPLOAD_CLAIM_SECONDS / 4
+    last = time.monotonic()
+
+    def heartbeat():
+        nonlocal last
+        if time.monotonic() - last < interval:
+            return
+        last = time.monotonic()
+        if not MediaUpload.objects.filter(pk=upload.pk, claimed_by=upload.claimed_by).update(
+            claimed_at=timezone.now()
+        ):
+            raise UploadConflict('Приём этой части прерван: загрузку продолжил другой запрос.')
+    return heartbeat
+
+
+def release_claim(upload):
+    MediaUpload.objects.filter(pk=upload.pk, claimed_by=upload.claimed_by).update(claimed_by='', claimed_at=None)
+
+
+def receive_chunk(upload, stream, content_range, content_length):
+    """
+    Принять часть файла. Параллельная часть той же загрузки получает 409,
+    часть не с того байта — 409 с принятым объёмом, по которому клиент продолжает.
+    """
+    start, end, total = parse_content_range(content_range)
+    length = end - start + 1
+    if content_length != length:
+        raise ValidationError({'Content-Length': 'Должен совпадать с длиной диапазона Content-Range.'})
+
+    path = temp_path(upload)
+    # Тело читается из сети вне транзакции: медленный клиент не держит соединение
+    # с БД в состоянии idle in transaction и блокировку строки
+    upload = claim_upload(upload, start, total)
+    try:
+        write_range(path, stream, start, length, claim_heartbeat(upload))
+    except BaseException:
+        release_claim(upload)
+        raise
+
+    with transaction.atomic():
+        claimed_by = upload.claimed_by
+        upload = lock_upload(upload)
+        if upload.claimed_by != claimed_by:
+            raise UploadConflict('Приём этой части прерван: загрузку продолжил другой запрос.')
+        upload.claimed_by = ''
+        upload.claimed_at = None
+        upload.received = end + 1
+        if not upload.content_type and upload.received >= min(HEAD_SIZE, upload.size):
+            with open(path, 'rb') as f:
+                upload.content_type = detect_content_type(f.read(HEAD_SIZE))
+        rejected = bool(upload.content_type) and upload.content_type != extension_type(upload.filename)
+        if rejected:
+            upload.delete()
+        else:
+            if upload.received == upload.size:
+                upload.status = MediaUploadStatusEnum.COMPLETE
+            upload.save()
+
+    if rejected:
+        remove_file(path)
+        raise UnsupportedMediaType(
+            upload.content_type,
+            detail='Содержимое файла не соответствует его расширению; загрузка отменена.',
+        )
+    return upload
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def discard(upload):
+    """Удалить загрузку вместе с принятыми байтами."""
+    path = temp_path(upload)  # delete() обнуляет pk
+    upload.delete()
+    remove_file(path)
+
+
+def attach(upload, delivery):
+    """
+    Перенести загруженный файл в хранилище как медиафайл доставки. Прежние файл
+    и превью удаляются, новое превью строится после коммита.
+    """
+    path = temp_path(upload)
+    with transaction.atomic():
+        upload = MediaUpload.objects.select_for_update().get(pk=upload.pk)
+        if upload.status != MediaUploadStatusEnum.COMPLETE:
+            raise UploadConflict('Файл загружен не полностью.', received=upload.received)
+        replaced = [field.name for field in (delivery.media_file, delivery.media_preview) if field]
+        with open(path, 'rb') as f:
+            # Хранилище копирует файл блоками, не читая его в память целиком
+            delivery.media_file.save(upload.filename, File(f), save=False)
+        delivery.media_preview = ''
+        delivery.save(update_fields=['media_file', 'media_preview'])
+        upload.delete()
+
+        def cleanup():
+            remove_file(path)
+            # Если прежнего файла уже не было в хранилище, новый мог получить то же имя
+            for name in set(replaced) - {delivery.media_file.name}:
+                delivery.media_file.storage.delete(name)
+            schedule_preview(delivery.pk)
+        transaction.on_commit(cleanup)
+    return delivery
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def preview_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.MEDIA_PREVIEW_WORKERS,
+                thread_name_prefix='media-preview',
+            )
+        return _executor
+
+
+def schedule_preview(delivery_id):
+    """
+    Построить превью: заданием очереди (MEDIA_PREVIEW_QUEUE — выполнит run_jobs,
+    с повторами), в пуле потоков или сразу при MEDIA_PREVIEW_WORKERS=0.
+    """
+    if settings.MEDIA_PREVIEW_QUEUE:
+        # deliveries.jobs импортирует этот модуль
+        from deliveries.jobs import enqueue
+
+        enqueue(JobKindEnum.MEDIA_PREVIEW, {'delivery': delivery_id})
+    elif settings.MEDIA_PREVIEW_WORKERS <= 0:
+        _build_preview_logged(delivery_id)
+    else:
+        preview_executor().submit(_build_preview_in_worker, delivery_id)
+
+
+def _build_preview_in_worker(delivery_id):
+    try:
+        _build_preview_logged(delivery_id)
+    finally:
+        # У каждого потока пула свои соединения с БД
+        connections.close_all()
+
+
+def _build_preview_logged(delivery_id):
+    # Ошибки превью пишутся в лог, запрос они не затрагивают
+    try:
+        build_preview(delivery_id)
+    except Exception:
+        logger.exception('Failed to build media preview for delivery %s', delivery_id)
+
+
+def build_preview(delivery_id):
+    """Уменьшенная JPEG-копия изображения доставки; возвращает имя превью или None, если его нет."""
+    delivery = Delivery.objects.only('id', 'user_id', 'media_file', 'media_preview').filter(pk=delivery_id).first()
+    if delivery is None or not delivery.media_file:
+        return None
+    name = delivery.media_file.name
+    if extension_type(name) not in PREVIEW_TYPES:
+        return None
+
+    size = settings.MEDIA_PREVIEW_SIZE
+    buffer = BytesIO()
+    with delivery.media_file.open('rb') as source, Image.open(source) as image:
+        # JPEG сразу декодируется в уменьшенном масштабе — без полного растра в памяти
+        image.draft('RGB', (size, size))
+        preview = ImageOps.exif_transpose(image)
+        preview.thumbnail((size, size))
+        preview.convert('RGB').save(buffer, 'JPEG', quality=80, optimize=True)
+    delivery.media_preview.save(f'{delivery_id}.jpg', ContentFile(buffer.getvalue()), save=False)
+
+    with transaction.atomic():
+        # Файл могли заменить, пока строилось превью
+        updated = Delivery.objects.filter(pk=delivery_id, media_file=name).update(
+            media_preview=delivery.media_preview.name
+        )
+        if updated:
+            # update() не отправляет сигналы, а превью входит в ответы API
+            versions.bump([delivery.user_id])
+    if not updated:
+        delivery.media_preview.delete(save=False)
+        return None
+    return delivery.media_preview.name
+
+
+# Имена файлов уникальны (хранилище не перезаписывает существующие), поэтому
+# браузеру можно не перепроверять их час; private — не для общих кэшей
+CACHE_CONTROL = 'private, max-age=3600'
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def can_access(user, name):
+    """Файл name — медиафайл или превью доставки пользователя (сотрудникам — любой доставки)."""
+    deliveries = Delivery.objects.filter(Q(media_file=name) | Q(media_preview=name))
+    if not user.is_staff:
+        deliveries = deliveries.filter(user=user)
+    return name != '' and deliveries.exists()
+
+
+def parse_range(header, size):
+    """
+    (start, end) единственного диапазона из Range; None — отдать файл целиком
+    (заголовка нет, он некорректен или диапазонов несколько), ValueError — диапазон вне файла.
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # bytes=-N: последние N байт
+        if int(last) == 0:
+            raise ValueError(header)
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def if_range_matches(request, etag, last_modified):
+    """If-Range: диапазон отдаётся, только если у клиента та же версия файла."""
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag  # только сильное сравнение
+    return parse_http_date_safe(value) == last_modified
+
+
+class RangeFile:
+    """Чтение файла не дальше length байт от текущей позиции — для закрытого диапазона."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def serve(request, name):
+    """Ответ с файлом name из хранилища; доступ проверяется до вызова (can_access)."""
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    if settings.MEDIA_OFFLOAD_HEADER == 'X-Accel-Redirect':
+        # Файл, Range и условные запросы обслуживает nginx (location с internal)
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + quote(name)
+        response['Cache-Control'] = CACHE_CONTROL
+        return response
+
+    path = default_storage.path(name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404
+    if settings.MEDIA_OFFLOAD_HEADER == 'X-Sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        response['Cache-Control'] = CACHE_CONTROL
+        return response
+
+    size = stat.st_size
+    etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+    last_modified = int(stat.st_mtime)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': CACHE_CONTROL,
+    }
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    byte_range = None
+    if request.method == 'GET' and if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    f = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(f, content_type=content_type)
+    else:
+        start, end = byte_range
+        f.seek(start)
+        if end == size - 1:
+            # До конца файла: сам файл, с текущей позиции его отправит sendfile
+            response = FileResponse(f, content_type=content_type, status=206)
+        else:
+            response = FileResponse(RangeFile(f, end - start + 1), content_type=content_type, status=206)
+            response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    for header, value in headers.items():
+        response[header] = value
+    return response
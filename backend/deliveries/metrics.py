@@ -0,0 +1,349 @@
+"""
+Метрики запросов к API по представлениям: число SQL-запросов и время в БД,
+время сериализации (построение .data сериализаторами внутри представления,
+см. deliveries.serializers.TimedDataMixin) и отрисовки ответа рендерером
+после представления, размер ответа.
+
+MetricsMiddleware подключается при METRICS_ENABLED=True; иначе Django
+исключает её из цепочки (MiddlewareNotUsed), обёртки SQL не ставятся и
+/metrics не подключается. /metrics требует Bearer-токен METRICS_TOKEN,
+а без него доступен только сотрудникам (сессия админки). Значения
+отдаются в заголовке Server-Timing каждого ответа и накопленными
+по процессу — в текстовом формате Prometheus на /metrics.
+SQL-запросы дольше METRICS_SLOW_QUERY_MS и одинаковые запросы, повторённые в
+одном HTTP-запросе METRICS_REPEATED_QUERY_THRESHOLD и более раз (признак N+1),
+пишутся в лог deliveries.metrics нормализованным текстом с отпечатком.
+SQL, выполненный после выхода из middleware (потоковая выгрузка), не учитывается.
+"""
+import hashlib
+import hmac
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+from deliveries.auth import auth_failures
+from deliveries.cache import summary_stats, user_stats
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'\?(?:\s*,\s*\?)+')
+_ROWS = re.compile(r'(\([^()]*\))(?:\s*,\s*\1)+')
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """SQL без значений: литералы и параметры — ?, списки IN (...) и VALUES схлопнуты."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql).replace('%s', '?')
+    sql = _PLACEHOLDERS.sub('?, ...', sql)
+    sql = _ROWS.sub(r'\1, ...', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.md5(normalized_sql.encode()).hexdigest()[:12]
+
+
+class RequestMetrics:
+    """Счётчики одного HTTP-запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slow_queries = 0
+        self.statements = Counter()
+        self.serialize_time = 0.0
+        self.view_done = None  # time.perf_counter() на выходе из представления
+        self.view_sql_time = 0.0  # sql_time к этому моменту
+
+
+_current = ContextVar('request_metrics', default=None)
+
+
+@contextmanager
+def serializing():
+    """Учесть время блока как сериализацию текущего HTTP-запроса (без SQL, выполненного внутри)."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    sql_time = metrics.sql_time
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started - (metrics.sql_time - sql_time)
+        metrics.serialize_time += max(elapsed, 0.0)
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper: время и число запросов текущего HTTP-запроса."""
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if metrics is not None:
+            duration = time.perf_counter() - started
+            metrics.queries += 1
+            metrics.sql_time += duration
+            metrics.statements[sql] += 1
+            if duration * 1000 >= settings.METRICS_SLOW_QUERY_MS:
+                metrics.slow_queries += 1
+                normalized = normalize_sql(sql)
+                logger.warning(
+                    'Slow query %.1f ms on %s [%s]: %s',
+                    duration * 1000, context['connection'].alias, fingerprint(normalized), normalized,
+                )
+
+
+def install_wrapper(sender=None, connection=None, **kwargs):
+    """
+    Обёртка ставится на само соединение, а не на время запроса: в async-представлениях
+    ORM работает в потоках sync_to_async со своими объектами соединений.
+    Запрос, к которому относится SQL, определяет contextvar.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def view_label(request):
+    """
+    Имя представления для меток: DeliveryViewSet.list, CookieTokenObtainPairView,
+    admin:deliveries_delivery_changelist, async_views.delivery_list.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    func = match.func
+    cls = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+    if cls is None:
+        if match.url_name:
+            return match.view_name
+        return f'{func.__module__.rpartition(".")[2]}.{func.__qualname__}'
+    action = (getattr(func, 'actions', None) or {}).get(request.method.lower())
+    return f'{cls.__name__}.{action}' if action else cls.__name__
+
+
+class ViewStats:
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.response_bytes = 0
+        self.slow_queries = 0
+        self.repeated_queries = 0
+
+
+class MetricsRegistry:
+    """Накопленные метрики в пределах процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+        self.responses = Counter()
+
+    def observe(self, view, method, status, duration, render_time, response_bytes, metrics, repeated):
+        with self._lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = ViewStats()
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    stats.buckets[index] += 1
+            stats.count += 1
+            stats.duration += duration
+            stats.queries += metrics.queries
+            stats.sql_time += metrics.sql_time
+            stats.serialize_time += metrics.serialize_time
+            stats.render_time += render_time
+            stats.response_bytes += response_bytes
+            stats.slow_queries += metrics.slow_queries
+            stats.repeated_queries += repeated
+            self.responses[view, method, status] += 1
+
+    def render(self):
+        with self._lock:
+            views = sorted(self.views.items())
+            responses = sorted(self.responses.items())
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for suffix, labels, value in samples:
+                lines.append(f'{name}{suffix}{format_labels(labels)} {value}')
+
+        metric('deliveries_http_responses_total', 'counter', 'HTTP responses by view, method and status.', [
+            ('', {'view': view, 'method': method, 'status': status}, count)
+            for (view, method, status), count in responses
+        ])
+        duration_samples = []
+        for view, stats in views:
+            for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                duration_samples.append(('_bucket', {'view': view, 'le': repr(bound)}, count))
+            duration_samples.append(('_bucket', {'view': view, 'le': '+Inf'}, stats.count))
+            duration_samples.append(('_sum', {'view': view}, round(stats.duration, 6)))
+            duration_samples.append(('_count', {'view': view}, stats.count))
+        metric('deliveries_http_request_duration_seconds', 'histogram',
+               'Time spent in the request, including middleware.', duration_samples)
+        for name, attribute, help_text, digits in (
+            ('deliveries_db_queries_total', 'queries', 'SQL queries executed.', None),
+            ('deliveries_db_query_seconds_total', 'sql_time', 'Time spent executing SQL.', 6),
+            ('deliveries_serialize_seconds_total', 'serialize_time',
+             'Time spent building serializer data in views, SQL excluded.', 6),
+            ('deliveries_render_seconds_total', 'render_time',
+             'Time spent rendering responses after the view (JSONRenderer), SQL excluded.', 6),
+            ('deliveries_response_bytes_total', 'response_bytes', 'Response body size, streaming responses excluded.', None),
+            ('deliveries_slow_queries_total', 'slow_queries', 'SQL queries slower than METRICS_SLOW_QUERY_MS.', None),
+            ('deliveries_repeated_queries_total', 'repeated_queries',
+             'Statements repeated METRICS_REPEATED_QUERY_THRESHOLD times within one request.', None),
+        ):
+            metric(name, 'counter', help_text, [
+                ('', {'view': view}, round(getattr(stats, attribute), digits) if digits else getattr(stats, attribute))
+                for view, stats in views
+            ])
+
+        metric('deliveries_cache_requests_total', 'counter', 'Process-local cache lookups.', [
+            ('', {'cache': cache, 'result': result}, getattr(stats, attribute))
+            for cache, stats in (('summary', summary_stats), ('auth_user', user_stats))
+            for result, attribute in (('hit', 'hits'), ('miss', 'misses'))
+        ])
+        metric('deliveries_auth_failures_total', 'counter', 'Rejected JWT authentication attempts.', [
+            ('', {'reason': reason}, count) for reason, count in sorted(auth_failures().items())
+        ])
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + '}'
+
+
+registry = MetricsRegistry()
+
+
+def metrics_view(request):
+    """
+    Метрики процесса в текстовом формате Prometheus: с METRICS_TOKEN — только
+    с Bearer-токеном, без него — только сотрудникам (сессия админки).
+    """
+    if settings.METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'):
+            return HttpResponse(status=401)
+    elif not request.user.is_staff:
+        return HttpResponse(status=403)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+            # Синхронный хук в async-цепочке Django выполнял бы в отдельном потоке
+            self.process_template_response = self.aprocess_template_response
+        connection_created.connect(install_wrapper, dispatch_uid='deliveries.metrics')
+        for connection in connections.all(initialized_only=True):
+            install_wrapper(connection=connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    def process_template_response(self, request, response):
+        # DRF Response отрисовывается после этого хука
+        self.mark_view_done()
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        self.mark_view_done()
+        return response
+
+    def mark_view_done(self):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view_done = time.perf_counter()
+            metrics.view_sql_time = metrics.sql_time
+
+    def finish(self, request, response, metrics, started):
+        finished = time.perf_counter()
+        duration = finished - started
+        render_time = 0.0
+        if metrics.view_done:
+            # Без SQL, выполненного при отрисовке (ленивые queryset в шаблонах)
+            render_time = max(finished - metrics.view_done - (metrics.sql_time - metrics.view_sql_time), 0.0)
+        view = view_label(request)
+        response_bytes = 0 if response.streaming else len(response.content)
+
+        repeated = 0
+        for sql, count in metrics.statements.items():
+            if count >= settings.METRICS_REPEATED_QUERY_THRESHOLD:
+                repeated += 1
+                normalized = normalize_sql(sql)
+                logger.warning(
+                    'Query repeated %d times in %s [%s]: %s', count, view, fingerprint(normalized), normalized
+                )
+        if metrics.slow_queries:
+            logger.warning('%d slow queries in %s %s (%s)', metrics.slow_queries, request.method, request.path, view)
+
+        registry.observe(
+            view, request.method, response.status_code, duration, render_time, response_bytes, metrics, repeated
+        )
+        app_time = max(duration - metrics.sql_time - metrics.serialize_time - render_time, 0.0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.sql_time * 1000:.2f};desc="{metrics.queries} queries"',
+            f'app;dur={app_time * 1000:.2f}',
+            f'serialize;dur={metrics.serialize_time * 1000:.2f}',
+            f'render;dur={render_time * 1000:.2f}',
+            f'total;dur={duration * 1000:.2f}',
+        ])
+        return response
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-17 22:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('deliveries', '0002_remove_delivery_transport_number_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='delivery',
+            index=models.Index(fields=['user', '-departure_datetime', 'id'], name='delivery_user_departure_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='delivery',
+            index=models.Index(fields=['user', 'distance_km', 'id'], name='delivery_user_distance_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='delivery',
+            index=models.Index(fields=['user', 'cargo_type', 'departure_datetime'], name='delivery_user_cargo_idx'),
+        ),
+        # Одиночный индекс по user_id дублирует префикс составных индексов
+        migrations.AlterField(
+            model_name='delivery',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='deliveries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        # Фильтр services=<id>: поиск доставок по услуге без обращения к самой таблице связей
+        migrations.RunSQL(
+            sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS delivery_services_service_idx '
+                'ON deliveries_delivery_services (service_id, delivery_id);',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS delivery_services_service_idx;',
+        ),
+    ]
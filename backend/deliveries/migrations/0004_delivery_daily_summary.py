@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 22:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0003_delivery_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('in_transit', 'В пути'), ('delivered', 'Доставлено'), ('cancelled', 'Отменено')], max_length=20, verbose_name='Статус доставки')),
+                ('deliveries_count', models.IntegerField(default=0, verbose_name='Количество доставок')),
+                ('cargo_type', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='deliveries.cargotype', verbose_name='Тип груза')),
+                ('service', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='deliveries.service', verbose_name='Услуга')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Дневная сводка доставок',
+                'verbose_name_plural': 'Дневные сводки доставок',
+                'constraints': [models.UniqueConstraint(fields=('user', 'day', 'cargo_type', 'service', 'status'), name='delivery_summary_key', nulls_distinct=False)],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-17 22:12
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('deliveries', '0004_delivery_daily_summary'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        # Поиск по подстроке (search): выражения индексов совпадают с тем,
+        # во что компилируется field__icontains — UPPER("field"::text) LIKE UPPER(...)
+        migrations.RunSQL(
+            sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS transport_plate_trgm_idx '
+                'ON deliveries_transportmodel USING gin ((UPPER(plate_number::text)) gin_trgm_ops);',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS transport_plate_trgm_idx;',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS auth_user_username_trgm_idx '
+                'ON auth_user USING gin ((UPPER(username::text)) gin_trgm_ops);',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS auth_user_username_trgm_idx;',
+        ),
+    ]
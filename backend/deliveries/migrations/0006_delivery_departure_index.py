@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-17 22:34
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('deliveries', '0005_search_trigram_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='delivery',
+            index=models.Index(fields=['departure_datetime', 'id'], name='delivery_departure_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 22:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0006_delivery_departure_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDeliveryVersion',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Версия')),
+                ('modified_at', models.DateTimeField(verbose_name='Время изменения')),
+            ],
+            options={
+                'verbose_name': 'Версия данных пользователя',
+                'verbose_name_plural': 'Версии данных пользователей',
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-17 22:41
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0007_user_delivery_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='media_preview',
+            field=models.FileField(blank=True, editable=False, upload_to='deliveries/previews/', verbose_name='Превью медиафайла'),
+        ),
+        migrations.CreateModel(
+            name='MediaUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('size', models.BigIntegerField(verbose_name='Размер, байт')),
+                ('received', models.BigIntegerField(default=0, verbose_name='Принято, байт')),
+                ('content_type', models.CharField(blank=True, max_length=100, verbose_name='Тип содержимого')),
+                ('status', models.CharField(choices=[('uploading', 'Загружается'), ('complete', 'Загружен')], default='uploading', max_length=20, verbose_name='Статус загрузки')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True, verbose_name='Изменена')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Загрузка медиафайла',
+                'verbose_name_plural': 'Загрузки медиафайлов',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-17 22:52
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('deliveries', '0008_media_upload'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='delivery',
+            index=models.Index(condition=models.Q(('media_file', ''), _negated=True), fields=['media_file'], name='delivery_media_file_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='delivery',
+            index=models.Index(condition=models.Q(('media_preview', ''), _negated=True), fields=['media_preview'], name='delivery_media_preview_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-17 22:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0009_delivery_media_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('export', 'Выгрузка доставок'), ('rebuild_summary', 'Пересборка дневной сводки'), ('media_preview', 'Превью медиафайла')], max_length=30, verbose_name='Тип задания')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='Параметры')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('succeeded', 'Выполнено'), ('failed', 'Ошибка'), ('cancelled', 'Отменено')], default='queued', max_length=20, verbose_name='Статус')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Попыток')),
+                ('max_attempts', models.IntegerField(verbose_name='Максимум попыток')),
+                ('run_after', models.DateTimeField(verbose_name='Выполнить после')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Воркер')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Сигнал воркера')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Результат')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начато')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Фоновое задание',
+                'verbose_name_plural': 'Фоновые задания',
+                'indexes': [models.Index(condition=models.Q(('status', 'queued')), fields=['run_after', 'id'], name='job_queued_idx'), models.Index(condition=models.Q(('status', 'running')), fields=['locked_at'], name='job_running_idx'), models.Index(fields=['user', '-created_at'], name='job_user_idx')],
+            },
+        ),
+    ]
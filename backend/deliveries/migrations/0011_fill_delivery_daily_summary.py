@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def fill_summary(apps, schema_editor):
+    """
+    Однократное заполнение дневной сводки по уже существующим доставкам;
+    дальше её поддерживают сигналы, а после массовых записей без сигналов —
+    rebuild_delivery_summary.
+    """
+    day = '(d.departure_datetime AT TIME ZONE %s)::date'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('TRUNCATE deliveries_deliverydailysummary')
+        cursor.execute(
+            'INSERT INTO deliveries_deliverydailysummary '
+            '(user_id, day, cargo_type_id, service_id, status, deliveries_count) '
+            f'SELECT d.user_id, {day}, d.cargo_type_id, NULL, d.status, COUNT(*) '
+            'FROM deliveries_delivery d GROUP BY 1, 2, 3, 5',
+            [settings.TIME_ZONE],
+        )
+        cursor.execute(
+            'INSERT INTO deliveries_deliverydailysummary '
+            '(user_id, day, cargo_type_id, service_id, status, deliveries_count) '
+            f'SELECT d.user_id, {day}, d.cargo_type_id, ds.service_id, d.status, COUNT(*) '
+            'FROM deliveries_delivery d JOIN deliveries_delivery_services ds ON ds.delivery_id = d.id '
+            'GROUP BY 1, 2, 3, 4, 5',
+            [settings.TIME_ZONE],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0010_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_summary, migrations.RunPython.noop),
+    ]
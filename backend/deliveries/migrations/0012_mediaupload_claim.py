@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0011_fill_delivery_daily_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaupload',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Сигнал принимающего запроса'),
+        ),
+        migrations.AddField(
+            model_name='mediaupload',
+            name='claimed_by',
+            field=models.CharField(blank=True, editable=False, max_length=32, verbose_name='Принимающий запрос'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.core.validators import RegexValidator, FileExtensionValidator
 from django.db import models
 
@@ -123,6 +125,13 @@ class Delivery(models.Model):
             )
         ]
     )
+    # Уменьшенная копия изображения для списков; строится в фоне (deliveries/media.py)
+    media_preview = models.FileField(
+        verbose_name="Превью медиафайла",
+        upload_to='deliveries/previews/',
+        blank=True,
+        editable=False
+    )
 
     # 6. Услуга — несколько опций
     services = models.ManyToManyField(
@@ -172,7 +181,8 @@ class Delivery(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.PROTECT,
         related_name='deliveries',
-        verbose_name="Пользователь"
+        verbose_name="Пользователь",
+        db_index=False  # покрывается составными индексами по user ниже
     )
 
     def __str__(self):
@@ -182,3 +192,280 @@ class Delivery(models.Model):
         verbose_name = "Доставка"
         verbose_name_plural = "Доставки"
         ordering = ['-departure_datetime']
+        # Индексы повторяют форму запросов DeliveryViewSet: всё фильтруется по user
+        indexes = [
+            # список по умолчанию, keyset-пагинация и диапазон дат
+            models.Index(fields=['user', '-departure_datetime', 'id'], name='delivery_user_departure_idx'),
+            # ordering=distance_km
+            models.Index(fields=['user', 'distance_km', 'id'], name='delivery_user_distance_idx'),
+            # фильтр по типу груза + диапазон дат (список и summary)
+            models.Index(fields=['user', 'cargo_type', 'departure_datetime'], name='delivery_user_cargo_idx'),
+            # список админки по всем пользователям: сортировка, date_hierarchy и фильтр по дате
+            models.Index(fields=['departure_datetime', 'id'], name='delivery_departure_idx'),
+            # проверка доступа к медиафайлу по его имени; файлы есть у немногих доставок
+            models.Index(fields=['media_file'], name='delivery_media_file_idx', condition=~models.Q(media_file='')),
+            models.Index(fields=['media_preview'], name='delivery_media_preview_idx',
+                         condition=~models.Q(media_preview='')),
+        ]
+
+
+class DeliveryDailySummary(models.Model):
+    """
+    Дневной агрегат доставок для /deliveries/summary/.
+
+    Строка с service=NULL — итог по всем доставкам дня вне зависимости от услуг,
+    строки с заполненным service — доставки, в которых есть эта услуга.
+    Поддерживается сигналами (deliveries.signals) и пересобирается командой
+    rebuild_delivery_summary.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False,
+        verbose_name="Пользователь"
+    )
+    day = models.DateField(verbose_name="День")
+    cargo_type = models.ForeignKey(
+        CargoType,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False,
+        blank=True,
+        null=True,
+        verbose_name="Тип груза"
+    )
+    service = models.ForeignKey(
+        Service,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False,
+        blank=True,
+        null=True,
+        verbose_name="Услуга"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=DeliveryStatusEnum.choices,
+        verbose_name="Статус доставки"
+    )
+    deliveries_count = models.IntegerField(
+        default=0,
+        verbose_name="Количество доставок"
+    )
+
+    def __str__(self):
+        return f"{self.day}: {self.deliveries_count}"
+
+    class Meta:
+        verbose_name = "Дневная сводка доставок"
+        verbose_name_plural = "Дневные сводки доставок"
+        constraints = [
+            # NULL в cargo_type/service — полноценное значение ключа
+            models.UniqueConstraint(
+                fields=['user', 'day', 'cargo_type', 'service', 'status'],
+                name='delivery_summary_key',
+                nulls_distinct=False,
+            ),
+        ]
+
+
+class MediaUploadStatusEnum(models.TextChoices):
+    UPLOADING = 'uploading', 'Загружается'
+    COMPLETE = 'complete', 'Загружен'
+
+
+class MediaUpload(models.Model):
+    """
+    Загрузка медиафайла по частям (Content-Range) с возможностью продолжить
+    после обрыва. Принятые байты лежат во временном файле (deliveries/media.py),
+    после загрузки файл прикрепляется к доставке, а запись удаляется.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Пользователь"
+    )
+    filename = models.CharField(
+        verbose_name="Имя файла",
+        max_length=255
+    )
+    size = models.BigIntegerField(verbose_name="Размер, байт")
+    received = models.BigIntegerField(
+        default=0,
+        verbose_name="Принято, байт"
+    )
+    # Определяется по сигнатуре первых байтов, а не со слов клиента
+    content_type = models.CharField(
+        verbose_name="Тип содержимого",
+        max_length=100,
+        blank=True
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=MediaUploadStatusEnum.choices,
+        default=MediaUploadStatusEnum.UPLOADING,
+        verbose_name="Статус загрузки"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Создана"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Изменена",
+        db_index=True  # очистка брошенных загрузок
+    )
+    # Часть, которая сейчас принимается: метка запроса и время его последнего сигнала
+    claimed_by = models.CharField(
+        verbose_name="Принимающий запрос",
+        max_length=32,
+        blank=True,
+        editable=False
+    )
+    claimed_at = models.DateTimeField(
+        verbose_name="Сигнал принимающего запроса",
+        null=True,
+        blank=True,
+        editable=False
+    )
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+    class Meta:
+        verbose_name = "Загрузка медиафайла"
+        verbose_name_plural = "Загрузки медиафайлов"
+
+
+class JobKindEnum(models.TextChoices):
+    EXPORT = 'export', 'Выгрузка доставок'
+    REBUILD_SUMMARY = 'rebuild_summary', 'Пересборка дневной сводки'
+    MEDIA_PREVIEW = 'media_preview', 'Превью медиафайла'
+
+
+class JobStatusEnum(models.TextChoices):
+    QUEUED = 'queued', 'В очереди'
+    RUNNING = 'running', 'Выполняется'
+    SUCCEEDED = 'succeeded', 'Выполнено'
+    FAILED = 'failed', 'Ошибка'
+    CANCELLED = 'cancelled', 'Отменено'
+
+
+class Job(models.Model):
+    """
+    Фоновое задание в очереди на таблице БД (deliveries.jobs): выполняется
+    командой run_jobs, при ошибке повторяется с нарастающей задержкой.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        blank=True,
+        null=True,
+        verbose_name="Пользователь"
+    )
+    kind = models.CharField(
+        max_length=30,
+        choices=JobKindEnum.choices,
+        verbose_name="Тип задания"
+    )
+    params = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Параметры"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=JobStatusEnum.choices,
+        default=JobStatusEnum.QUEUED,
+        verbose_name="Статус"
+    )
+    attempts = models.IntegerField(
+        default=0,
+        verbose_name="Попыток"
+    )
+    max_attempts = models.IntegerField(verbose_name="Максимум попыток")
+    # Не раньше этого момента: повторы после ошибки откладываются
+    run_after = models.DateTimeField(verbose_name="Выполнить после")
+    # Воркер, взявший задание, и его последний сигнал: задание без сигнала
+    # дольше JOBS_LEASE_SECONDS возвращается в очередь
+    locked_by = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name="Воркер"
+    )
+    locked_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="Сигнал воркера"
+    )
+    result = models.JSONField(
+        blank=True,
+        null=True,
+        verbose_name="Результат"
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="Ошибка"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Создано"
+    )
+    started_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="Начато"
+    )
+    finished_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="Завершено"
+    )
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.id} ({self.status})"
+
+    class Meta:
+        verbose_name = "Фоновое задание"
+        verbose_name_plural = "Фоновые задания"
+        indexes = [
+            # выбор следующего задания воркером: только ожидающие, по времени запуска
+            models.Index(fields=['run_after', 'id'], name='job_queued_idx', condition=models.Q(status='queued')),
+            # поиск зависших заданий
+            models.Index(fields=['locked_at'], name='job_running_idx', condition=models.Q(status='running')),
+            # список заданий пользователя
+            models.Index(fields=['user', '-created_at'], name='job_user_idx'),
+        ]
+
+
+class UserDeliveryVersion(models.Model):
+    """
+    Версия данных пользователя: растёт при каждом изменении его доставок, их
+    услуг и справочников, которые попадают в ответы (deliveries.versions).
+    Из неё строятся ETag/Last-Modified списка, карточки и summary и ключ кэша summary.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name="Пользователь"
+    )
+    version = models.BigIntegerField(
+        default=0,
+        verbose_name="Версия"
+    )
+    modified_at = models.DateTimeField(
+        verbose_name="Время изменения"
+    )
+
+    def __str__(self):
+        return f"{self.user_id}: {self.version}"
+
+    class Meta:
+        verbose_name = "Версия данных пользователя"
+        verbose_name_plural = "Версии данных пользователей"
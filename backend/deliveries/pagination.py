@@ -1,6 +1,225 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, InvalidPage, Page, Paginator
+from django.utils.functional import cached_property
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, CursorPagination, Cursor
+
 
 class DeliveriesPageNumberPagination(PageNumberPagination):
     page_size = 10                    # значение по умолчанию
     page_size_query_param = 'page_size'  # параметр запроса
     max_page_size = 100               # максимальный размер страницы
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset для async-представлений: COUNT(*) и выборка страницы через async ORM."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()  # иначе Paginator посчитает синхронно
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return [item async for item in self.page.object_list]
+
+
+class EstimatedCountPage(Page):
+    def has_next(self):
+        # При оценочном count наличие следующей страницы известно по лишней строке выборки
+        if self.has_more is not None:
+            return self.has_more
+        return super().has_next()
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator, который не считает COUNT(*) по всей выборке.
+
+    Строки считаются с LIMIT exact_count_threshold + 1: если их не больше порога,
+    count точный. Иначе count — оценка планировщика из EXPLAIN (не меньше порога),
+    а count_is_exact = False. Страницы за пределами оценки не дают 404, а
+    возвращаются пустыми; следующая страница определяется по лишней строке выборки.
+    """
+
+    def __init__(self, *args, exact_count_threshold=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if exact_count_threshold is None:
+            exact_count_threshold = settings.EXACT_COUNT_THRESHOLD
+        self.exact_count_threshold = exact_count_threshold
+        self.count_is_exact = True
+
+    @cached_property
+    def count(self):
+        threshold = self.exact_count_threshold
+        count = self.object_list[:threshold + 1].count()
+        if count <= threshold:
+            return count
+        self.count_is_exact = False
+        return max(self.estimate_count(), threshold + 1)
+
+    def estimate_count(self):
+        plan = json.loads(self.object_list.order_by().explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def validate_number(self, number):
+        self.count  # count_is_exact известен только после подсчёта
+        if self.count_is_exact:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            return super().validate_number(number)
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_is_exact:
+            page = super().page(number)
+            page.has_more = None
+            return page
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        page = self._get_page(rows[:self.per_page], number, self)
+        page.has_more = len(rows) > self.per_page
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedCountPage(*args, **kwargs)
+
+
+class DeliveriesEstimatedCountPagination(DeliveriesPageNumberPagination):
+    """
+    Постраничная выдача с оценочным count для больших выборок
+    (см. EstimatedCountPaginator); count_is_exact в ответе говорит, точен ли count.
+    """
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_is_exact'] = self.page.paginator.count_is_exact
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_exact'] = {'type': 'boolean', 'example': True}
+        return response_schema
+
+
+class DeliveriesCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация по паре (поле сортировки, id).
+
+    В отличие от стандартной CursorPagination из DRF, позиция курсора хранит
+    и значение поля, и id последней строки, поэтому страница выбирается
+    условием `WHERE (поле, id) > (значение, id)` без OFFSET и COUNT(*):
+    время ответа не зависит от глубины страницы.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-departure_datetime'
+    tiebreaker = 'id'                 # уникальное поле для разрешения равных значений
+    position_separator = '|'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        # Курсор строится только по первому полю сортировки + id
+        self.ordering = self.get_ordering(request, queryset, view)[:1]
+        self.field_name = self.ordering[0].lstrip('-')
+        self.descending = self.ordering[0].startswith('-')
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor.reverse if self.cursor else False
+
+        queryset = queryset.order_by(*self._get_order_by(reverse))
+        if self.cursor is not None:
+            queryset = queryset.filter(self._get_keyset_filter(self.cursor.position, reverse))
+
+        # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next = self.cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None:
+            return None
+        value, sep, pk = (cursor.position or '').rpartition(self.position_separator)
+        if not sep:
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            opts = self.model._meta
+            value = opts.get_field(self.field_name).to_python(value)
+            pk = opts.get_field(self.tiebreaker).to_python(pk)
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=cursor.reverse, position=(value, pk))
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field_name in (self.field_name, self.tiebreaker):
+            if isinstance(instance, dict):
+                attr = instance[field_name]
+            else:
+                attr = getattr(instance, field_name)
+            values.append(attr.isoformat() if hasattr(attr, 'isoformat') else str(attr))
+        return self.position_separator.join(values)
+
+    def _get_order_by(self, reverse):
+        field = self.field_name if self.descending == reverse else f'-{self.field_name}'
+        tiebreaker = f'-{self.tiebreaker}' if reverse else self.tiebreaker
+        return field, tiebreaker
+
+    def _get_keyset_filter(self, position, reverse):
+        """
+        Условие «строго после позиции» в направлении обхода.
+        Внешнее нестрогое сравнение по полю даёт планировщику диапазон для индекса.
+        """
+        value, pk = position
+        field_op = 'lt' if self.descending != reverse else 'gt'
+        pk_op = 'lt' if reverse else 'gt'
+        return Q(**{f'{self.field_name}__{field_op}e': value}) & (
+            Q(**{f'{self.field_name}__{field_op}': value})
+            | Q(**{self.field_name: value, f'{self.tiebreaker}__{pk_op}': pk})
+        )
@@ -0,0 +1,20 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class PassthroughRenderer(BaseRenderer):
+    """
+    Рендерер для действий, которые сами формируют HttpResponse (файлы, потоки):
+    проходит согласование по любому Accept и возвращает данные как есть.
+    Остальные ответы тех же действий (ошибки проверки, 404) отдаются как JSON.
+    """
+    media_type = '*/*'
+    format = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, str)):
+            return data
+        # Content-Type ответа уже выставлен по Accept клиента (например, text/csv)
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = JSONRenderer.media_type
+        return JSONRenderer().render(data, JSONRenderer.media_type, renderer_context)
@@ -0,0 +1,144 @@
+"""
+Инкрементальное обслуживание таблицы DeliveryDailySummary.
+
+Каждая доставка даёт вклад +1 в строку (user, day, cargo_type, NULL, status)
+и по +1 в строку (user, day, cargo_type, service, status) для каждой своей услуги.
+При изменении доставки вычисляется разница вкладов «до» и «после», которая
+применяется одним UPSERT-запросом.
+"""
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from deliveries import versions
+from deliveries.filters import local_date
+from deliveries.models import Delivery, DeliveryDailySummary
+
+DeliveryServices = Delivery.services.through
+
+
+def collect_contributions(delivery_ids):
+    """Вклад доставок delivery_ids в дневную сводку: Counter {ключ: количество}."""
+    contributions = Counter()
+    delivery_ids = list(delivery_ids)
+    if not delivery_ids:
+        return contributions
+
+    services = defaultdict(list)
+    for delivery_id, service_id in DeliveryServices.objects.filter(
+        delivery_id__in=delivery_ids
+    ).values_list('delivery_id', 'service_id'):
+        services[delivery_id].append(service_id)
+
+    rows = Delivery.objects.filter(pk__in=delivery_ids).values_list(
+        'id', 'user_id', 'departure_datetime', 'cargo_type_id', 'status'
+    )
+    for delivery_id, user_id, departure, cargo_type_id, status in rows:
+        add_contribution(contributions, user_id, departure, cargo_type_id, status, services[delivery_id])
+    return contributions
+
+
+def add_contribution(contributions, user_id, departure, cargo_type_id, status, service_ids):
+    """Добавить в contributions вклад одной доставки (без запросов — для ещё не прочитанных из БД строк)."""
+    day = local_date(departure)
+    contributions[(user_id, day, cargo_type_id, None, status)] += 1
+    for service_id in service_ids:
+        contributions[(user_id, day, cargo_type_id, service_id, status)] += 1
+
+
+def apply_delta(before, after):
+    """Применить к сводке разницу вкладов after - before."""
+    delta = Counter(after)
+    delta.subtract(before)
+    rows = [(*key, count) for key, count in delta.items() if count]
+    if not rows:
+        return
+
+    table = DeliveryDailySummary._meta.db_table
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))
+    params = [value for row in rows for value in row]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, day, cargo_type_id, service_id, status, deliveries_count) '
+            f'VALUES {placeholders} '
+            f'ON CONFLICT ON CONSTRAINT delivery_summary_key '
+            f'DO UPDATE SET deliveries_count = {table}.deliveries_count + EXCLUDED.deliveries_count',
+            params,
+        )
+
+
+def add_staged(staging_table, user_id):
+    """
+    Добавить к сводке вклад новых доставок пользователя user_id из таблицы staging_table
+    (столбцы departure_datetime, cargo_type_id, status и массив service_ids) —
+    агрегирующими запросами, без чтения строк в Python.
+    """
+    table = DeliveryDailySummary._meta.db_table
+    day = '(s.departure_datetime AT TIME ZONE %s)::date'
+    upsert = (
+        f'ON CONFLICT ON CONSTRAINT delivery_summary_key '
+        f'DO UPDATE SET deliveries_count = {table}.deliveries_count + EXCLUDED.deliveries_count'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, day, cargo_type_id, service_id, status, deliveries_count) '
+            f'SELECT %s, {day}, s.cargo_type_id, NULL, s.status, COUNT(*) '
+            f'FROM {staging_table} s GROUP BY 2, 3, 5 {upsert}',
+            [user_id, settings.TIME_ZONE],
+        )
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, day, cargo_type_id, service_id, status, deliveries_count) '
+            f'SELECT %s, {day}, s.cargo_type_id, ds.service_id, s.status, COUNT(*) '
+            f'FROM {staging_table} s CROSS JOIN LATERAL unnest(s.service_ids) AS ds(service_id) '
+            f'GROUP BY 2, 3, 4, 5 {upsert}',
+            [user_id, settings.TIME_ZONE],
+        )
+
+
+def rebuild(user_ids=None):
+    """
+    Полностью пересобрать сводку (или только для пользователей user_ids)
+    агрегирующими запросами на стороне БД.
+    """
+    table = DeliveryDailySummary._meta.db_table
+    deliveries = Delivery._meta.db_table
+    through = DeliveryServices._meta.db_table
+    day = '(d.departure_datetime AT TIME ZONE %s)::date'
+    user_filter = 'WHERE d.user_id = ANY(%s)' if user_ids is not None else ''
+    user_params = [list(user_ids)] if user_ids is not None else []
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if user_ids is None:
+            cursor.execute(f'TRUNCATE {table}')
+        else:
+            cursor.execute(f'DELETE FROM {table} WHERE user_id = ANY(%s)', user_params)
+        # Итоги по всем доставкам (service = NULL)
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, day, cargo_type_id, service_id, status, deliveries_count) '
+            f'SELECT d.user_id, {day}, d.cargo_type_id, NULL, d.status, COUNT(*) '
+            f'FROM {deliveries} d {user_filter} '
+            f'GROUP BY 1, 2, 3, 5',
+            [settings.TIME_ZONE, *user_params],
+        )
+        # Разбивка по услугам
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, day, cargo_type_id, service_id, status, deliveries_count) '
+            f'SELECT d.user_id, {day}, d.cargo_type_id, ds.service_id, d.status, COUNT(*) '
+            f'FROM {deliveries} d JOIN {through} ds ON ds.delivery_id = d.id {user_filter} '
+            f'GROUP BY 1, 2, 3, 4, 5',
+            [settings.TIME_ZONE, *user_params],
+        )
+
+
+def rebuild_and_bump(user_ids=None):
+    """
+    rebuild и смена версии данных тех же пользователей в одной транзакции:
+    пересборка следует за массовыми изменениями, которые версию не меняли.
+    """
+    with transaction.atomic():
+        rebuild(user_ids)
+        if user_ids is None:
+            versions.bump_all()
+        else:
+            versions.bump(user_ids)
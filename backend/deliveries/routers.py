@@ -0,0 +1,149 @@
+"""
+Чтение с реплик PostgreSQL.
+
+ReplicaRoutingMiddleware отмечает запрос в contextvar: безопасные запросы
+(GET/HEAD/OPTIONS) могут читать с реплики, остальные работают только с primary.
+PrimaryReplicaRouter отправляет чтение на реплику, выбранную один раз на запрос,
+и закрепляет запрос за primary после первой записи в нём. После небезопасного
+запроса клиент получает куку, и следующие DB_REPLICA_PIN_SECONDS секунд его
+чтения тоже идут на primary — он видит свои изменения несмотря на отставание реплик.
+Недоступная реплика исключается на DB_REPLICA_RETRY_SECONDS секунд.
+Вне HTTP-запросов (команды, потоковая отдача ответа после выхода из
+middleware) всё идёт на primary — queryset для потоковой выдачи нужно
+заранее привязать к read_alias().
+"""
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import OperationalError
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    """Маршрутизация в пределах одного запроса."""
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.replica = None
+
+
+_state = ContextVar('db_routing_state', default=None)
+
+# Реплики, недоступные до указанного момента (time.monotonic), в пределах процесса
+_down_until = {}
+_down_lock = threading.Lock()
+_round_robin = itertools.count()
+
+
+def replica_aliases():
+    return settings.DB_REPLICAS
+
+
+def mark_down(alias):
+    with _down_lock:
+        _down_until[alias] = time.monotonic() + settings.DB_REPLICA_RETRY_SECONDS
+
+
+def healthy_replicas():
+    now = time.monotonic()
+    with _down_lock:
+        return [alias for alias in replica_aliases() if _down_until.get(alias, 0) <= now]
+
+
+def choose_replica():
+    """Следующая доступная реплика по кругу или primary, если доступных нет."""
+    replicas = healthy_replicas()
+    start = next(_round_robin)
+    for offset in range(len(replicas)):
+        alias = replicas[(start + offset) % len(replicas)]
+        try:
+            connections[alias].ensure_connection()
+        except OperationalError:
+            logger.warning('Replica %s is unavailable', alias, exc_info=True)
+            mark_down(alias)
+            continue
+        return alias
+    return DEFAULT_DB_ALIAS
+
+
+def read_alias():
+    """Алиас БД для чтения в текущем запросе."""
+    return PrimaryReplicaRouter().db_for_read(None)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.pinned or not replica_aliases():
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            state.replica = choose_replica()
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Дальнейшие чтения в этом запросе — с primary, где уже есть запись
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _state.set(self.get_state(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        token = _state.set(self.get_state(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.process_response(request, response)
+
+    def get_state(self, request):
+        pinned = request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+        return RoutingState(pinned=pinned)
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS and replica_aliases():
+            response.set_cookie(
+                PIN_COOKIE,
+                '1',
+                max_age=settings.DB_REPLICA_PIN_SECONDS,
+                httponly=True,
+                secure=True,
+                samesite='None',
+            )
+        return response
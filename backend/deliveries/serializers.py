@@ -1,6 +1,29 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.fields.files import FieldFile
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+
+from deliveries.export import STREAMERS
+from deliveries.media import extension_type
+from deliveries.metrics import serializing
+from deliveries.models import Delivery, TransportModel, PackagingType, Service, CargoType, DeliveryStatusEnum, \
+    MediaUpload, Job, JobKindEnum, JobStatusEnum
+
+
+class TimedDataMixin:
+    """Время построения .data учитывается в метриках запроса как сериализация (deliveries.metrics)."""
+
+    @property
+    def data(self):
+        with serializing():
+            return super().data
 
-from deliveries.models import Delivery, TransportModel, PackagingType, Service, CargoType, DeliveryStatusEnum
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
 
 
 class TransportModelSerializer(serializers.ModelSerializer):
@@ -9,25 +32,28 @@ class TransportModelSerializer(serializers.ModelSerializer):
         fields = ['id', 'plate_number']
 
 
-class PackagingTypeSerializer(serializers.ModelSerializer):
+class PackagingTypeSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = PackagingType
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'title']
 
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Service
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'name']
 
 
-class CargoTypeSerializer(serializers.ModelSerializer):
+class CargoTypeSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = CargoType
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'name']
 
 
-class DeliverySerializer(serializers.ModelSerializer):
+class DeliverySerializer(TimedDataMixin, serializers.ModelSerializer):
     transport_model = TransportModelSerializer(read_only=True)
     packaging = PackagingTypeSerializer(read_only=True)
     services = ServiceSerializer(read_only=True, many=True)
@@ -42,3 +68,171 @@ class DeliverySerializer(serializers.ModelSerializer):
     class Meta:
         model = Delivery
         fields = '__all__'
+
+
+class DeliveryRowListSerializer(TimedListSerializer):
+    """Загружает услуги всей страницы одним запросом."""
+
+    def to_representation(self, data):
+        rows = list(data)
+        return self.build(rows, self.get_service_links(rows))
+
+    async def ato_representation(self, rows):
+        """to_representation для async-представлений: rows — уже загруженный список строк."""
+        return self.build(rows, [link async for link in self.get_service_links(rows)])
+
+    def get_service_links(self, rows):
+        return (
+            Delivery.services.through.objects
+            .filter(delivery_id__in=[row['id'] for row in rows])
+            .order_by('service_id')
+            .values_list('delivery_id', 'service_id', 'service__name')
+        )
+
+    def build(self, rows, links):
+        services = defaultdict(list)
+        for delivery_id, service_id, name in links:
+            services[delivery_id].append({'id': service_id, 'name': name})
+        return [self.child.row_to_representation(row, services[row['id']]) for row in rows]
+
+
+class DeliveryRowSerializer(serializers.BaseSerializer):
+    """
+    Быстрое read-only представление доставки для списка.
+
+    Принимает строки `.values(*values_fields)` вместо экземпляров моделей и
+    собирает тот же JSON, что DeliverySerializer, без вложенных сериализаторов:
+    подписи статусов берутся из готового словаря, а скалярные поля форматируются
+    теми же полями DRF, что и в DeliverySerializer.
+    """
+    username_field = f'user__{get_user_model().USERNAME_FIELD}'
+    values_fields = (
+        'id',
+        'transport_model_id', 'transport_model__plate_number',
+        'packaging_id', 'packaging__title',
+        'cargo_type_id', 'cargo_type__name',
+        'status',
+        username_field,
+        'departure_datetime',
+        'arrival_datetime',
+        'distance_km',
+        'media_file',
+        'media_preview',
+        'technical_state',
+    )
+    status_labels = {value: str(label) for value, label in DeliveryStatusEnum.choices}
+    media_model_field = Delivery._meta.get_field('media_file')
+    preview_model_field = Delivery._meta.get_field('media_preview')
+
+    class Meta:
+        list_serializer_class = DeliveryRowListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = DeliverySerializer(context=self.context).fields
+        self.departure_field = fields['departure_datetime']
+        self.arrival_field = fields['arrival_datetime']
+        self.distance_field = fields['distance_km']
+        self.media_field = fields['media_file']
+        self.preview_field = fields['media_preview']
+
+    def to_representation(self, instance):
+        return self.row_to_representation(instance, [])
+
+    def row_to_representation(self, row, services):
+        cargo_type_id = row['cargo_type_id']
+        media_file = row['media_file']
+        media_preview = row['media_preview']
+        return {
+            'id': row['id'],
+            'transport_model': {
+                'id': row['transport_model_id'],
+                'plate_number': row['transport_model__plate_number'],
+            },
+            'packaging': {
+                'id': row['packaging_id'],
+                'title': row['packaging__title'],
+            },
+            'services': services,
+            'cargo_type': None if cargo_type_id is None else {
+                'id': cargo_type_id,
+                'name': row['cargo_type__name'],
+            },
+            'status': row['status'],
+            'status_display': self.status_labels.get(row['status'], row['status']),
+            'user': row[self.username_field],
+            'departure_datetime': self.departure_field.to_representation(row['departure_datetime']),
+            'arrival_datetime': self.arrival_field.to_representation(row['arrival_datetime']),
+            'distance_km': self.distance_field.to_representation(row['distance_km']),
+            'media_file': self.media_field.to_representation(
+                FieldFile(None, self.media_model_field, media_file) if media_file else None
+            ),
+            'media_preview': self.preview_field.to_representation(
+                FieldFile(None, self.preview_model_field, media_preview) if media_preview else None
+            ),
+            'technical_state': row['technical_state'],
+        }
+
+
+class MediaUploadSerializer(TimedDataMixin, serializers.ModelSerializer):
+    class Meta:
+        model = MediaUpload
+        fields = ['id', 'filename', 'size', 'received', 'content_type', 'status', 'created_at']
+        read_only_fields = ['id', 'received', 'content_type', 'status', 'created_at']
+
+    def validate_filename(self, value):
+        # Только имя, без пути клиента (в том числе windows-пути)
+        value = value.replace('\\', '/').rpartition('/')[2]
+        if extension_type(value) is None:
+            raise serializers.ValidationError('Допустимые форматы: PDF, JPG, JPEG, PNG.')
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.MEDIA_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f'Размер файла — от 1 до {settings.MEDIA_UPLOAD_MAX_SIZE} байт.')
+        return value
+
+
+class MediaAttachSerializer(serializers.Serializer):
+    upload = serializers.UUIDField()
+
+
+class JobSerializer(TimedDataMixin, serializers.ModelSerializer):
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        list_serializer_class = TimedListSerializer
+        fields = ['id', 'kind', 'params', 'status', 'attempts', 'max_attempts', 'result', 'error',
+                  'created_at', 'started_at', 'finished_at', 'download']
+        read_only_fields = ['id', 'status', 'attempts', 'max_attempts', 'result', 'error',
+                            'created_at', 'started_at', 'finished_at']
+
+    def validate(self, attrs):
+        kind = attrs['kind']
+        params = attrs.get('params') or {}
+        user = self.context['request'].user
+        if not isinstance(params, dict):
+            raise serializers.ValidationError({'params': 'Ожидается объект.'})
+        if kind == JobKindEnum.EXPORT:
+            # Параметры — те же, что у GET /deliveries/export/; фильтры проверит воркер
+            if params.get('export_format', 'csv') not in STREAMERS:
+                raise serializers.ValidationError(
+                    {'params': f'export_format: допустимые значения: {", ".join(STREAMERS)}.'}
+                )
+        elif kind == JobKindEnum.REBUILD_SUMMARY:
+            if not user.is_staff:
+                raise serializers.ValidationError({'kind': 'Пересборка сводки доступна только сотрудникам.'})
+            if not isinstance(params.get('users', []), list):
+                raise serializers.ValidationError({'params': 'users: ожидается список имён пользователей.'})
+        elif kind == JobKindEnum.MEDIA_PREVIEW:
+            delivery_id = params.get('delivery')
+            if not isinstance(delivery_id, int) or not Delivery.objects.filter(pk=delivery_id, user=user).exists():
+                raise serializers.ValidationError({'params': 'delivery: доставка не найдена.'})
+        attrs['params'] = params
+        return attrs
+
+    def get_download(self, job):
+        if job.status != JobStatusEnum.SUCCEEDED or not (job.result or {}).get('file'):
+            return None
+        return reverse('job-download', args=[job.pk], request=self.context.get('request'))
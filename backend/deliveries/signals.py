@@ -0,0 +1,107 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from deliveries import jobs, rollup, versions
+from deliveries.cache import invalidate_reference, invalidate_user, plate_cache
+from deliveries.models import Delivery, CargoType, Service, PackagingType, TransportModel, Job
+
+# Массовые операции (QuerySet.update, bulk_create) сигналы не отправляют —
+# после них сводку нужно пересобрать командой rebuild_delivery_summary.
+
+
+def apply_summary_delta(before, after):
+    """Обновить дневную сводку и версию данных затронутых пользователей (она же сбрасывает кэш summary)."""
+    rollup.apply_delta(before, after)
+    versions.bump({key[0] for key in (*before, *after)})
+
+
+@receiver(pre_save, sender=Delivery)
+def remember_summary_contribution(sender, instance, **kwargs):
+    instance._summary_before = rollup.collect_contributions([instance.pk]) if instance.pk else Counter()
+
+
+@receiver(post_save, sender=Delivery)
+def update_summary_on_save(sender, instance, **kwargs):
+    before = instance.__dict__.pop('_summary_before', Counter())
+    apply_summary_delta(before, rollup.collect_contributions([instance.pk]))
+
+
+@receiver(pre_delete, sender=Delivery)
+def remember_summary_contribution_on_delete(sender, instance, **kwargs):
+    instance._summary_before = rollup.collect_contributions([instance.pk])
+
+
+@receiver(post_delete, sender=Delivery)
+def update_summary_on_delete(sender, instance, **kwargs):
+    apply_summary_delta(instance.__dict__.pop('_summary_before', Counter()), Counter())
+
+
+@receiver(m2m_changed, sender=Delivery.services.through)
+def update_summary_on_services_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith('pre_'):
+        if not reverse:
+            delivery_ids = [instance.pk]
+        elif pk_set is not None:
+            delivery_ids = list(pk_set)
+        else:
+            # service.deliveries.clear(): затронуты все доставки этой услуги
+            delivery_ids = list(instance.deliveries.values_list('id', flat=True))
+        instance._summary_services_before = (delivery_ids, rollup.collect_contributions(delivery_ids))
+    elif action.startswith('post_'):
+        delivery_ids, before = instance.__dict__.pop('_summary_services_before', ([], Counter()))
+        apply_summary_delta(before, rollup.collect_contributions(delivery_ids))
+
+
+@receiver(post_save, sender=CargoType)
+@receiver(post_delete, sender=CargoType)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=PackagingType)
+@receiver(post_delete, sender=PackagingType)
+def invalidate_reference_cache(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate_reference(sender))
+
+
+@receiver(post_save, sender=TransportModel)
+@receiver(post_delete, sender=TransportModel)
+def invalidate_plate_cache(sender, **kwargs):
+    # Прежний номер переименованной записи неизвестен — сбрасывается весь кэш
+    transaction.on_commit(lambda: plate_cache().clear())
+
+
+@receiver(post_save, sender=CargoType)
+@receiver(post_delete, sender=CargoType)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=PackagingType)
+@receiver(post_delete, sender=PackagingType)
+@receiver(post_save, sender=TransportModel)
+@receiver(post_delete, sender=TransportModel)
+def bump_versions_on_reference_change(sender, **kwargs):
+    # Названия и номера входят в ответы по доставкам всех пользователей
+    versions.bump_all()
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user_cache(sender, instance, **kwargs):
+    # Сразу и после коммита: чтобы кэш не успел заполниться старой версией
+    invalidate_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_user(instance.pk))
+
+
+@receiver(post_save, sender=get_user_model())
+def bump_version_on_user_change(sender, instance, update_fields=None, **kwargs):
+    # Логин пользователя входит в ответы; вход в систему обновляет только last_login
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        versions.bump([instance.pk])
+
+
+@receiver(post_delete, sender=Job)
+def delete_job_result_file(sender, instance, **kwargs):
+    # Удаление задания (и пользователя, каскадом) не должно оставлять файл выгрузки в хранилище
+    jobs.delete_result_file(instance)
@@ -0,0 +1,52 @@
+"""
+Потоковые ответы под ASGI.
+
+Django под ASGI читает синхронный итератор StreamingHttpResponse (выгрузка,
+FileResponse медиафайлов и результатов заданий) целиком через
+sync_to_async(list) и только потом отправляет первый байт — память снова
+зависит от размера ответа. AsyncStreamingMiddleware подменяет такой итератор
+асинхронным, который читает его порциями в потоке запроса (thread_sensitive:
+там же, где открыт серверный курсор выгрузки). Под WSGI middleware не
+подключается.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
+
+# Сколько байт набирать за один переход в поток
+CHUNK_SIZE = 64 * 1024
+
+
+def _next_chunk(iterator):
+    parts = []
+    size = 0
+    for part in iterator:
+        parts.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            break
+    return b''.join(parts)
+
+
+async def iterate_in_thread(iterator):
+    """Асинхронный итератор по синхронному iterator (байтовые части), порциями до CHUNK_SIZE."""
+    next_chunk = sync_to_async(_next_chunk, thread_sensitive=True)
+    while chunk := await next_chunk(iterator):
+        yield chunk
+
+
+class AsyncStreamingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not iscoroutinefunction(get_response):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        markcoroutinefunction(self)
+
+    async def __call__(self, request):
+        response = await self.get_response(request)
+        if response.streaming and not response.is_async:
+            # Закрытие исходного итератора (и файла) остаётся в response.close()
+            response.streaming_content = iterate_in_thread(iter(response.streaming_content))
+        return response
@@ -0,0 +1,80 @@
+"""
+Продолжение import_deliveries после сбоя: файл ошибок (--errors) содержит
+ошибку каждой отклонённой записи ровно один раз, где бы ни оборвался импорт.
+"""
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from deliveries.management.commands.import_deliveries import Command
+from deliveries.models import Delivery, PackagingType
+
+User = get_user_model()
+
+VALID_ROW = {
+    'plate_number': 'А123ВС',
+    'departure_datetime': '2025-05-01T08:00:00+03:00',
+    'arrival_datetime': '2025-05-01T17:30:00+03:00',
+    'distance_km': '412.50',
+    'packaging': 'Коробка',
+}
+# Порции по 2 записи: в каждой одна принимается и одна отклоняется
+ROWS = [VALID_ROW, {**VALID_ROW, 'status': 'lost'}] * 3
+CHUNK_SIZE = 2
+
+
+class Crash(Exception):
+    pass
+
+
+class ImportResumeTests(TransactionTestCase):
+    def setUp(self):
+        PackagingType.objects.create(title='Коробка')
+        self.user = User.objects.create_user(username='importer', password=None)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'deliveries.ndjson')
+        self.errors_path = os.path.join(directory.name, 'errors.ndjson')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(row, ensure_ascii=False) + '\n' for row in ROWS)
+
+    def run_import(self):
+        call_command('import_deliveries', self.path, user=self.user.username, workers=1, chunk_size=CHUNK_SIZE,
+                     errors=self.errors_path, stdout=StringIO(), stderr=StringIO())
+
+    def assert_errors_once(self):
+        with open(self.errors_path, encoding='utf-8') as f:
+            indexes = [json.loads(line)['index'] for line in f]
+        self.assertEqual(indexes, [1, 3, 5])
+        self.assertEqual(Delivery.objects.filter(user=self.user).count(), 3)
+
+    def crash_on(self, method, should_crash):
+        original = getattr(Command, method)
+
+        def crashing(command, *args):
+            if should_crash(*args):
+                raise Crash
+            return original(command, *args)
+        return mock.patch.object(Command, method, crashing)
+
+    def test_resume_after_crash_before_commit(self):
+        # Вторая порция разобрана, её ошибка записана, но транзакция не началась
+        with self.crash_on('load_chunk', lambda data, rows, user_id, end: end == 4):
+            with self.assertRaises(Crash):
+                self.run_import()
+        self.run_import()
+        self.assert_errors_once()
+
+    def test_resume_after_crash_after_commit(self):
+        # Вторая порция закоммичена, но итоговый чекпойнт не записан
+        with self.crash_on('save_checkpoint', lambda state: state.get('records') == 4 and 'pending' not in state):
+            with self.assertRaises(Crash):
+                self.run_import()
+        self.run_import()
+        self.assert_errors_once()
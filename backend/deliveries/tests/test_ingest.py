@@ -0,0 +1,122 @@
+"""
+Приём доставок пачками: поле неожиданного типа (список, объект, число вместо
+строки) — ошибка этой строки, а не исключение, которое прервало бы всю
+пачку /deliveries/bulk/ или import_deliveries; пачка записывается целиком
+или не оставляет следов.
+"""
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from deliveries import ingest
+from deliveries.cache import invalidate_reference, plate_cache
+from deliveries.management.commands.import_deliveries import parse_chunk
+from deliveries.models import Delivery, PackagingType, Service, TransportModel
+from deliveries.routers import PIN_COOKIE
+
+User = get_user_model()
+
+VALID_ROW = {
+    'plate_number': 'А123ВС',
+    'departure_datetime': '2025-05-01T08:00:00+03:00',
+    'arrival_datetime': '2025-05-01T17:30:00+03:00',
+    'distance_km': '412.50',
+    'status': 'pending',
+    'technical_state': 'ok',
+    'packaging': 'Коробка',
+    'cargo_type': None,
+    'services': [],
+}
+MALFORMED_VALUES = {
+    'plate_number': [['А123ВС'], {'plate': 'А123ВС'}, 123],
+    'departure_datetime': [['2025-05-01T08:00:00+03:00'], {}, 20250501],
+    'arrival_datetime': [['2025-05-01T17:30:00+03:00'], {}, 20250501],
+    'distance_km': [[412.5], {'km': 412.5}, True],
+    'status': [['pending'], {'value': 'pending'}, 1],
+    'technical_state': [['ok'], {'value': 'ok'}, 1],
+    'packaging': [['Коробка'], {'id': 1}, True],
+    'cargo_type': [[1], {'id': 1}, -1],
+    'services': ['Доставка', {'id': 1}, [[1]], [{'id': 1}]],
+}
+
+
+class IngestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        PackagingType.objects.create(title='Коробка')
+        cls.user = User.objects.create_user(username='ingest', password=None)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.user))
+        self.client.cookies[PIN_COOKIE] = '1'
+        plate_cache().clear()
+
+    def malformed_rows(self):
+        for field, values in MALFORMED_VALUES.items():
+            for value in values:
+                yield field, {**VALID_ROW, field: value}
+
+    def test_parse_row_reports_field_error(self):
+        for field, row in self.malformed_rows():
+            with self.subTest(field=field, value=row[field]):
+                values, errors = ingest.parse_row(row)
+                self.assertIsNone(values)
+                self.assertIn(field, errors)
+
+    def test_bulk_rejects_rows_without_aborting(self):
+        fields, rows = zip(*self.malformed_rows())
+        response = self.client.post(
+            '/api/v1/deliveries/bulk/', [*rows, VALID_ROW], content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        body = response.json()
+        self.assertEqual(body['created'], 1)
+        self.assertEqual([(error['index'], list(error['errors'])) for error in body['errors']],
+                         [(index, [field]) for index, field in enumerate(fields)])
+        self.assertEqual(Delivery.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_ndjson_all_malformed_is_400(self):
+        body = '\n'.join(json.dumps(row, ensure_ascii=False) for _, row in self.malformed_rows())
+        response = self.client.post('/api/v1/deliveries/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(response.json()['created'], 0)
+
+    def test_import_chunk_rejects_rows_without_aborting(self):
+        lines = [json.dumps(row, ensure_ascii=False) for _, row in self.malformed_rows()]
+        _, _, errors, end = parse_chunk(('ndjson', None, 0, [*lines, json.dumps(VALID_ROW)]))
+        self.assertEqual(end, len(lines) + 1)
+        self.assertEqual(len(errors), len(lines))
+
+    def test_failed_batch_leaves_no_new_plates(self):
+        row = {**VALID_ROW, 'plate_number': 'Е555КХ'}
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch.object(Delivery.objects, 'bulk_create', side_effect=IntegrityError):
+                with self.assertRaises(IntegrityError):
+                    ingest.ingest([row], self.user.pk)
+        self.assertFalse(TransportModel.objects.filter(plate_number='Е555КХ').exists())
+        self.assertIsNone(plate_cache().get('Е555КХ'))
+
+    def test_reference_miss_reads_only_missing_refs(self):
+        invalidate_reference(Service)
+        first = Service.objects.create(name='Доставка')
+        lookup = ingest.reference_lookup(Service, 'name', set())
+        self.assertEqual(lookup, {first.pk: first.pk, 'Доставка': first.pk})
+
+        added = Service.objects.create(name='Погрузка')
+        with CaptureQueriesContext(connection) as captured:
+            lookup = ingest.reference_lookup(Service, 'name', {'Погрузка', 'нет такой', 10 ** 9})
+        self.assertEqual(len(captured), 1)
+        self.assertIn(' IN ', captured[0]['sql'])
+        self.assertEqual(lookup, {
+            first.pk: first.pk, 'Доставка': first.pk,
+            added.pk: added.pk, 'Погрузка': added.pk,
+        })
+        # Известные ссылки дальше берутся из кэша
+        with self.assertNumQueries(0):
+            ingest.reference_lookup(Service, 'name', {'Погрузка', first.pk})
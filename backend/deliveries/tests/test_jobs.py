@@ -0,0 +1,69 @@
+"""
+Файлы выгрузок фоновых заданий: удаляются по истечении EXPORT_RESULT_TTL_HOURS
+и вместе с заданием, чтобы хранилище не росло без предела.
+"""
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from deliveries import jobs
+from deliveries.models import Job, JobKindEnum, JobStatusEnum
+from deliveries.routers import PIN_COOKIE
+
+User = get_user_model()
+
+
+@override_settings(EXPORT_RESULT_TTL_HOURS=24)
+class ExportResultTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='export-jobs', password=None)
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = Client()
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.user))
+        self.client.cookies[PIN_COOKIE] = '1'
+
+    def run_export(self, finished_hours_ago=0):
+        job = jobs.enqueue(JobKindEnum.EXPORT, {'export_format': 'csv'}, user=self.user)
+        job.result = jobs.export_deliveries(job)
+        job.status = JobStatusEnum.SUCCEEDED
+        job.finished_at = timezone.now() - timedelta(hours=finished_hours_ago)
+        job.save()
+        self.assertTrue(default_storage.exists(job.result['file']))
+        return job
+
+    def test_expired_export_file_is_deleted(self):
+        fresh = self.run_export()
+        expired = self.run_export(finished_hours_ago=25)
+        name = expired.result['file']
+
+        self.assertEqual(jobs.purge_expired_exports(), 1)
+        self.assertEqual(jobs.purge_expired_exports(), 0)
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(fresh.result['file']))
+
+        expired.refresh_from_db()
+        self.assertNotIn('file', expired.result)
+        self.assertTrue(expired.result['expired'])
+        response = self.client.get(f'/api/v1/jobs/{expired.pk}/', HTTP_ACCEPT='application/json')
+        self.assertIsNone(response.json()['download'])
+        self.assertEqual(self.client.get(f'/api/v1/jobs/{expired.pk}/download/').status_code, 404)
+
+    def test_result_file_is_deleted_with_job(self):
+        job = self.run_export()
+        name = job.result['file']
+        with self.captureOnCommitCallbacks(execute=True):
+            Job.objects.filter(pk=job.pk).delete()
+        self.assertFalse(default_storage.exists(name))
@@ -0,0 +1,102 @@
+"""
+Приём медиафайла по частям: тело части читается вне транзакции, а от
+параллельной части загрузку защищает закрепление claimed_by/claimed_at.
+"""
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from deliveries.models import MediaUpload, MediaUploadStatusEnum
+from deliveries.routers import PIN_COOKIE
+
+User = get_user_model()
+
+CONTENT = b'%PDF-1.4\n' + bytes(range(256)) * 4
+HALF = len(CONTENT) // 2
+
+
+class MediaUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='media-upload', password=None)
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        settings_override = override_settings(MEDIA_UPLOAD_TEMP_DIR=temp_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = Client()
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.user))
+        self.client.cookies[PIN_COOKIE] = '1'
+        response = self.client.post(
+            '/api/v1/uploads/', {'filename': 'scan.pdf', 'size': len(CONTENT)}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.upload = MediaUpload.objects.get(pk=response.json()['id'])
+
+    def put(self, start, end, body=None):
+        body = CONTENT[start:end + 1] if body is None else body
+        return self.client.put(
+            f'/api/v1/uploads/{self.upload.pk}/',
+            body,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(CONTENT)}',
+        )
+
+    def test_parts_complete_upload(self):
+        self.assertEqual(self.put(0, HALF - 1).status_code, 200)
+        response = self.put(HALF, len(CONTENT) - 1)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.status, MediaUploadStatusEnum.COMPLETE)
+        self.assertEqual(self.upload.content_type, 'application/pdf')
+        self.assertEqual(self.upload.claimed_by, '')
+
+    def test_wrong_offset_returns_received_as_int(self):
+        self.put(0, HALF - 1)
+        response = self.put(0, HALF - 1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['received'], HALF)
+
+    def test_claimed_upload_rejects_parallel_part(self):
+        MediaUpload.objects.filter(pk=self.upload.pk).update(claimed_by='other', claimed_at=timezone.now())
+        response = self.put(0, HALF - 1)
+        self.assertEqual(response.status_code, 409)
+        self.upload.refresh_from_db()
+        self.assertEqual((self.upload.received, self.upload.claimed_by), (0, 'other'))
+
+    @override_settings(MEDIA_UPLOAD_CLAIM_SECONDS=60)
+    def test_stale_claim_is_taken_over(self):
+        MediaUpload.objects.filter(pk=self.upload.pk).update(
+            claimed_by='crashed', claimed_at=timezone.now() - timedelta(seconds=61)
+        )
+        self.assertEqual(self.put(0, HALF - 1).status_code, 200)
+        self.upload.refresh_from_db()
+        self.assertEqual((self.upload.received, self.upload.claimed_by), (HALF, ''))
+
+    def test_body_is_read_outside_transaction_and_claim_released_on_error(self):
+        seen = {}
+        # TestCase держит свои транзакции теста — receive_chunk не должна добавлять к ним свою
+        depth = len(connection.atomic_blocks)
+
+        def broken_write_range(path, stream, start, length, heartbeat):
+            seen['depth'] = len(connection.atomic_blocks)
+            seen['claimed_by'] = MediaUpload.objects.get(pk=self.upload.pk).claimed_by
+            raise ValidationError('Тело запроса короче, чем указано в Content-Range.')
+
+        with mock.patch('deliveries.media.write_range', broken_write_range):
+            response = self.put(0, HALF - 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(seen['depth'], depth)
+        self.assertNotEqual(seen['claimed_by'], '')
+        self.upload.refresh_from_db()
+        self.assertEqual((self.upload.received, self.upload.claimed_by), (0, ''))
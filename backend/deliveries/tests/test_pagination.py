@@ -0,0 +1,86 @@
+"""
+Пагинаторы списка доставок: keyset-курсор не теряет и не повторяет строки,
+даже если между запросами страниц добавляются доставки с тем же временем
+отправления; оценочный count точен на малых выборках.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from deliveries.models import Delivery, PackagingType, TransportModel
+from deliveries.routers import PIN_COOKIE
+
+User = get_user_model()
+
+DEPARTURE = timezone.make_aware(datetime(2025, 6, 1, 8))
+PAGE_SIZE = 4
+
+
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='pagination', password=None)
+        cls.transport = TransportModel.objects.create(plate_number='А123ВС')
+        cls.packaging = PackagingType.objects.create(title='Коробка')
+        # Группы по 5 доставок с одинаковым временем отправления
+        cls.create_deliveries([DEPARTURE - timedelta(hours=hour) for hour in range(4) for _ in range(5)])
+
+    @classmethod
+    def create_deliveries(cls, departures):
+        return Delivery.objects.bulk_create([
+            Delivery(
+                transport_model=cls.transport, packaging=cls.packaging, user=cls.user,
+                departure_datetime=departure, arrival_datetime=departure + timedelta(hours=1),
+                distance_km=Decimal('10.00'),
+            )
+            for departure in departures
+        ])
+
+    def setUp(self):
+        self.client = Client()
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.user))
+        self.client.cookies[PIN_COOKIE] = '1'
+
+    def get(self, url, **params):
+        response = self.client.get(url, params, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_cursor_pages_survive_inserts_with_equal_departure(self):
+        existing = list(Delivery.objects.filter(user=self.user).values_list('pk', flat=True))
+        seen = []
+        data = self.get('/api/v1/deliveries/', pagination='cursor', page_size=PAGE_SIZE)
+        # Ограничение на случай курсора, который не продвигается
+        for _ in range(100):
+            page = data['results']
+            seen.extend(row['id'] for row in page)
+            if not data['next']:
+                break
+            # Новые строки с тем же временем, что у последней строки страницы, и с соседними
+            last = Delivery.objects.get(pk=page[-1]['id']).departure_datetime
+            self.create_deliveries([last, last, last + timedelta(minutes=1), last - timedelta(minutes=1)])
+            data = self.get(data['next'])
+        else:
+            self.fail('обход страниц курсором не закончился')
+
+        self.assertEqual(len(seen), len(set(seen)), 'строки повторяются на разных страницах')
+        self.assertFalse(set(existing) - set(seen), 'строки, существовавшие до обхода, пропущены')
+        departures = dict(Delivery.objects.filter(pk__in=seen).values_list('pk', 'departure_datetime'))
+        keys = [(-departures[pk].timestamp(), pk) for pk in seen]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_cursor_previous_returns_same_page(self):
+        first = self.get('/api/v1/deliveries/', pagination='cursor', page_size=PAGE_SIZE)
+        second = self.get(first['next'])
+        self.create_deliveries([DEPARTURE])
+        back = self.get(second['previous'])
+        self.assertEqual([row['id'] for row in back['results']], [row['id'] for row in first['results']])
+
+    def test_estimated_count_is_exact_below_threshold(self):
+        data = self.get('/api/v1/deliveries/', pagination='estimated', page_size=PAGE_SIZE)
+        self.assertTrue(data['count_is_exact'])
+        self.assertEqual(data['count'], Delivery.objects.filter(user=self.user).count())
@@ -0,0 +1,141 @@
+"""
+Проверка на N+1: число SQL-запросов каждого эндпоинта API и каждого списка
+админки не должно зависеть от числа доставок. Снимаем его на N доставках,
+доводим их число до 10N и требуем столько же запросов — новое вложенное поле
+сериализатора или колонка админки без select_related/prefetch_related
+роняет тест.
+"""
+import random
+from datetime import datetime
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from deliveries import rollup, versions
+from deliveries.cache import invalidate_reference, user_cache
+from deliveries.management.commands.populate_db import (
+    DEFAULT_CARGO_TYPES, DEFAULT_PACKAGINGS, DEFAULT_SERVICES, create_batch, random_plate,
+)
+from deliveries.models import CargoType, Delivery, DeliveryStatusEnum, PackagingType, Service, TransportModel
+from deliveries.routers import PIN_COOKIE
+
+User = get_user_model()
+
+# N и 10N помещаются на одну страницу списка
+COUNT = 10
+FACTOR = 10
+API_PAGE = '?page_size=100'
+SEED = 0
+BASE_TIME = timezone.make_aware(datetime(2025, 6, 1))
+
+
+class QueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(SEED)
+        TransportModel.objects.bulk_create(
+            [TransportModel(plate_number=random_plate(rng)) for _ in range(10)], ignore_conflicts=True
+        )
+        PackagingType.objects.bulk_create([PackagingType(title=title) for title in DEFAULT_PACKAGINGS])
+        Service.objects.bulk_create([Service(name=name) for name in DEFAULT_SERVICES])
+        CargoType.objects.bulk_create([CargoType(name=name) for name in DEFAULT_CARGO_TYPES])
+        cls.user = User.objects.create_user(username='query-count', password=None)
+        cls.staff = User.objects.create_superuser(username='query-count-admin', password=None)
+        cls.refs = {
+            'transports': list(TransportModel.objects.values_list('pk', flat=True)),
+            'services': list(Service.objects.values_list('pk', flat=True)),
+            'packages': list(PackagingType.objects.values_list('pk', flat=True)),
+            'cargo_types': list(CargoType.objects.values_list('pk', flat=True)),
+            'users': [cls.user.pk],
+            'statuses': [choice[0] for choice in DeliveryStatusEnum.choices],
+        }
+
+    def setUp(self):
+        self.api_client = Client()
+        self.api_client.cookies['access_token'] = str(AccessToken.for_user(self.user))
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+        for client in (self.api_client, self.staff_client):
+            # Реплики (если настроены) не видят незакоммиченных данных теста
+            client.cookies[PIN_COOKIE] = '1'
+
+    def seed(self, size, batch_index):
+        create_batch(batch_index, size, SEED, self.refs, BASE_TIME)
+        # bulk_create не отправляет сигналы: сводку для summary пересобираем явно
+        rollup.rebuild([self.user.pk])
+
+    def reset_caches(self):
+        """Кэши процесса сбрасываются перед каждым запросом, чтобы сравнивать одинаковую работу."""
+        versions.bump([self.user.pk])  # заодно сбрасывает кэш summary
+        user_cache().clear()
+        for model in (CargoType, Service, PackagingType):
+            invalidate_reference(model)
+
+    def fetch(self, client, url):
+        self.reset_caches()
+        response = client.get(url, HTTP_ACCEPT='application/json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as captured:
+            self.fetch(client, url)
+        return len(captured)
+
+    def assert_constant_queries(self, client, get_urls):
+        """get_urls() — {сценарий: url} для уже созданных доставок."""
+        self.seed(COUNT, batch_index=0)
+        # Прогрев: кэши, которые заполняются один раз на процесс (ContentType и т. п.)
+        for url in get_urls().values():
+            self.fetch(client, url)
+        expected = {name: self.count_queries(client, url) for name, url in get_urls().items()}
+        self.seed(COUNT * FACTOR - COUNT, batch_index=1)
+        for name, url in get_urls().items():
+            with self.subTest(name):
+                with self.assertNumQueries(expected[name]):
+                    self.fetch(client, url)
+
+    def api_urls(self):
+        delivery = Delivery.objects.filter(user=self.user).order_by('-departure_datetime').first()
+        service_id = delivery.services.values_list('pk', flat=True).first()
+        return {
+            'deliveries': f'/api/v1/deliveries/{API_PAGE}',
+            'deliveries, cursor': f'/api/v1/deliveries/{API_PAGE}&pagination=cursor',
+            'deliveries, estimated': f'/api/v1/deliveries/{API_PAGE}&pagination=estimated',
+            'deliveries, search': f'/api/v1/deliveries/{API_PAGE}&search={self.user.username}',
+            'deliveries, services': f'/api/v1/deliveries/{API_PAGE}&services={service_id}',
+            'delivery': f'/api/v1/deliveries/{delivery.pk}/',
+            'summary': '/api/v1/deliveries/summary/',
+            'summary, services': f'/api/v1/deliveries/summary/?services={service_id}',
+            'export csv': '/api/v1/deliveries/export/?export_format=csv',
+            'export ndjson': '/api/v1/deliveries/export/?export_format=ndjson',
+            'cargo': '/api/v1/cargo/',
+            'services': '/api/v1/services/',
+            'packaging': '/api/v1/packaging/',
+            'jobs': '/api/v1/jobs/',
+        }
+
+    def admin_urls(self):
+        urls = {}
+        for model in admin.site._registry:
+            opts = model._meta
+            urls[opts.label_lower] = reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist')
+        urls['deliveries.delivery, user filter'] = (
+            reverse('admin:deliveries_delivery_changelist') + f'?user={self.user.username}'
+        )
+        delivery = Delivery.objects.filter(user=self.user).order_by('pk').first()
+        urls['deliveries.delivery change'] = reverse('admin:deliveries_delivery_change', args=[delivery.pk])
+        return urls
+
+    def test_api_endpoints(self):
+        self.assert_constant_queries(self.api_client, self.api_urls)
+
+    def test_admin_changelists(self):
+        self.assert_constant_queries(self.staff_client, self.admin_urls)
@@ -0,0 +1,67 @@
+"""
+Кэш списков справочников: одна запись на путь, страница и ссылки next/previous
+строятся по каждому запросу — Host и лишние параметры не размножают записи.
+"""
+import json
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import AsyncRequestFactory, Client, TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from deliveries import async_views
+from deliveries.cache import invalidate_reference, reference_cache
+from deliveries.models import CargoType
+from deliveries.routers import PIN_COOKIE
+
+User = get_user_model()
+
+URL = '/api/v1/cargo/'
+
+
+@override_settings(ALLOWED_HOSTS=['a.example', 'b.example', 'testserver'])
+class ReferenceCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        CargoType.objects.bulk_create([CargoType(name=f'Груз {number}') for number in range(15)])
+        cls.user = User.objects.create_user(username='reference-cache', password=None)
+
+    def setUp(self):
+        invalidate_reference(CargoType)
+        self.token = str(AccessToken.for_user(self.user))
+        self.client = Client()
+        self.client.cookies['access_token'] = self.token
+        self.client.cookies[PIN_COOKIE] = '1'
+
+    def get(self, query='', host='testserver', **headers):
+        return self.client.get(URL + query, HTTP_HOST=host, HTTP_ACCEPT='application/json', **headers)
+
+    def test_query_string_and_host_share_one_entry(self):
+        for number in range(5):
+            self.assertEqual(self.get(f'?junk={number}', host='a.example').status_code, 200)
+        response = self.get('?page=2', host='b.example')
+        self.assertEqual(len(reference_cache(CargoType)), 1)
+        self.assertEqual(response.json()['previous'], 'http://b.example/api/v1/cargo/')
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_cached_links_follow_request(self):
+        self.get('?junk=1', host='a.example')
+        with self.assertNumQueries(0):
+            response = self.get(host='b.example')
+        self.assertEqual(response.json()['next'], 'http://b.example/api/v1/cargo/?page=2')
+
+    def test_not_modified_and_missing_page(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get('?page=2', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get('?page=9').status_code, 404)
+
+    def test_async_view_paginates_cached_entry(self):
+        self.get(host='a.example')
+        request = AsyncRequestFactory().get(URL + '?page=2&junk=1', headers={'accept': 'application/json'})
+        request.COOKIES['access_token'] = self.token
+        with self.assertNumQueries(0):
+            response = async_to_sync(async_views.cargo_list)(request)
+        data = json.loads(response.content)
+        self.assertEqual(data['previous'], 'http://testserver/api/v1/cargo/?junk=1')
+        self.assertEqual(len(data['results']), 5)
+        self.assertEqual(len(reference_cache(CargoType)), 1)
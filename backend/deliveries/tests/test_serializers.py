@@ -0,0 +1,67 @@
+"""
+DeliveryRowSerializer (список из .values()) должен давать тот же JSON, что
+DeliverySerializer, байт в байт: порядок полей и услуг, подписи статусов,
+форматирование дат, расстояния и ссылок на медиафайлы.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from deliveries.models import CargoType, Delivery, DeliveryStatusEnum, PackagingType, Service, TransportModel
+from deliveries.serializers import DeliverySerializer, DeliveryRowSerializer
+from deliveries.views import DeliveryViewSet
+
+User = get_user_model()
+
+DEPARTURE = timezone.make_aware(datetime(2025, 6, 1, 8, 30, 15, 123456))
+
+
+class RowSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='row-serializer', password=None)
+        transport = TransportModel.objects.create(plate_number='А123ВС')
+        packaging = PackagingType.objects.create(title='Коробка')
+        cargo_type = CargoType.objects.create(name='Хрупкое')
+        # Созданы не в порядке id, в котором их отдаёт список
+        services = [Service.objects.create(name=name) for name in ('Погрузка', 'Доставка', 'Страховка')]
+        statuses = [*DeliveryStatusEnum.values, 'unknown']
+        for number, status in enumerate(statuses):
+            delivery = Delivery.objects.create(
+                transport_model=transport, packaging=packaging, user=cls.user, status=status,
+                cargo_type=cargo_type if number % 2 else None,
+                departure_datetime=DEPARTURE + timedelta(days=number),
+                arrival_datetime=DEPARTURE + timedelta(days=number, hours=3),
+                distance_km=Decimal('1234.50') if number % 2 else Decimal('7'),
+                media_file=f'deliveries/{number}/scan.pdf' if number % 2 else '',
+                media_preview=f'deliveries/{number}/preview.jpg' if number == 1 else '',
+                technical_state='bad' if number == 2 else 'ok',
+            )
+            delivery.services.set(reversed(services[:number]))
+
+    def test_row_serializer_matches_model_serializer(self):
+        request = Request(APIRequestFactory().get('/api/v1/deliveries/'))
+        request.user = self.user
+        view = DeliveryViewSet(request=request, format_kwarg=None, action='list')
+        queryset = view.filter_queryset(view.get_queryset())
+        context = view.get_serializer_context()
+
+        expected = JSONRenderer().render(DeliverySerializer(list(queryset), many=True, context=context).data)
+        rows = queryset.prefetch_related(None).values(*DeliveryRowSerializer.values_fields)
+        actual = JSONRenderer().render(DeliveryRowSerializer(rows, many=True, context=context).data)
+        self.assertEqual(actual, expected)
+
+        data = DeliveryRowSerializer(rows, many=True, context=context).data
+        self.assertEqual({row['status']: row['status_display'] for row in data}, {
+            **{value: str(label) for value, label in DeliveryStatusEnum.choices},
+            'unknown': 'unknown',
+        })
+        ids = [[service['id'] for service in row['services']] for row in data]
+        self.assertIn(sorted(Service.objects.values_list('pk', flat=True)), ids)
+        self.assertTrue(all(row_ids == sorted(row_ids) for row_ids in ids))
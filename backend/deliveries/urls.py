@@ -1,14 +1,17 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
 from deliveries.views import DeliveryViewSet, CargoTypeViewSet, ServiceViewSet, PackagingTypeViewSet, \
-    CookieTokenObtainPairView, CookieTokenRefreshView, LogoutView
+    MediaUploadViewSet, JobViewSet, CookieTokenObtainPairView, CookieTokenRefreshView, LogoutView
 
 router = DefaultRouter()
 router.register(r'deliveries', DeliveryViewSet, basename='delivery')
 router.register(r'cargo', CargoTypeViewSet, basename='cargo')
 router.register(r'services', ServiceViewSet, basename='service')
 router.register(r'packaging', PackagingTypeViewSet, basename='packaging')
+router.register(r'uploads', MediaUploadViewSet, basename='upload')
+router.register(r'jobs', JobViewSet, basename='job')
 
 urlpatterns = [
     path('token/', CookieTokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -16,3 +19,16 @@ urlpatterns = [
     path('logout/', LogoutView.as_view(), name='logout'),
     path('', include(router.urls)),
 ]
+
+if settings.ASYNC_API:
+    # Те же URL, но async-представления (для запуска под ASGI); остальное — DRF
+    from deliveries import async_views
+
+    urlpatterns = [
+        path('deliveries/', async_views.delivery_list),
+        path('deliveries/summary/', async_views.delivery_summary),
+        path('deliveries/<int:pk>/', async_views.delivery_detail),
+        path('cargo/', async_views.cargo_list),
+        path('services/', async_views.service_list),
+        path('packaging/', async_views.packaging_list),
+    ] + urlpatterns
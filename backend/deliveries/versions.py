@@ -0,0 +1,95 @@
+"""
+Версии данных пользователя для условных GET-запросов и ключей кэша summary.
+
+UserDeliveryVersion.version увеличивается в той же транзакции, что и изменение:
+доставок пользователя и их услуг — сигналами deliveries.signals, справочников
+и номеров транспорта (их значения входят в ответы) — у всех пользователей.
+Массовые операции без сигналов (bulk_create, QuerySet.update) вызывают bump явно.
+
+По версии строятся ETag и Last-Modified списка, карточки и summary: совпадающий
+If-None-Match (или If-Modified-Since) получает 304 одним запросом по первичному
+ключу — до основного запроса и сериализации. Версия общая для всех ответов
+пользователя, поэтому любое его изменение сбрасывает все их ETag.
+"""
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from deliveries.models import UserDeliveryVersion
+
+NO_VERSION = (0, None)
+
+
+def bump(user_ids):
+    """Увеличить версию данных пользователей user_ids (в текущей транзакции)."""
+    # Одинаковый порядок блокировок строк в параллельных транзакциях
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    table = UserDeliveryVersion._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, version, modified_at) '
+            f'SELECT user_id, 1, now() FROM unnest(%s::integer[]) AS user_id '
+            f'ON CONFLICT (user_id) DO UPDATE SET version = {table}.version + 1, modified_at = EXCLUDED.modified_at',
+            [user_ids],
+        )
+
+
+def bump_all():
+    """Увеличить версию всех пользователей: изменились данные, общие для их ответов."""
+    table = UserDeliveryVersion._meta.db_table
+    users = get_user_model()._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, version, modified_at) '
+            f'SELECT id, 1, now() FROM {users} ORDER BY id '
+            f'ON CONFLICT (user_id) DO UPDATE SET version = {table}.version + 1, modified_at = EXCLUDED.modified_at'
+        )
+
+
+def _version_queryset(user_id):
+    return UserDeliveryVersion.objects.filter(user_id=user_id).values_list('version', 'modified_at')
+
+
+def get_version(user_id):
+    """(версия, время изменения) данных пользователя; NO_VERSION, пока изменений не было."""
+    return _version_queryset(user_id).first() or NO_VERSION
+
+
+async def aget_version(user_id):
+    """Асинхронный вариант get_version."""
+    return await _version_queryset(user_id).afirst() or NO_VERSION
+
+
+def validator_headers(request, user_id, version):
+    """
+    ETag, Last-Modified и Cache-Control ответа для версии version. ETag слабый:
+    кроме данных ответ зависит от формата (browsable API отдаёт HTML с CSRF-токеном),
+    поэтому в него входят путь с параметрами и Accept.
+    """
+    number, modified_at = version
+    representation = f'{user_id}\n{request.get_full_path()}\n{request.META.get("HTTP_ACCEPT", "")}'
+    digest = hashlib.md5(representation.encode()).hexdigest()[:16]
+    # no-cache: клиент хранит ответ, но каждый раз сверяет его с сервером
+    headers = {'ETag': f'W/"{number}-{digest}"', 'Cache-Control': 'private, no-cache'}
+    if modified_at is not None:
+        headers['Last-Modified'] = http_date(modified_at.timestamp())
+    return headers
+
+
+def not_modified(request, version, headers):
+    """304 Not Modified с заголовками headers, если у клиента актуальный ответ, иначе None."""
+    modified_at = version[1]
+    response = get_conditional_response(
+        request,
+        etag=headers['ETag'],
+        last_modified=int(modified_at.timestamp()) if modified_at is not None else None,
+    )
+    if response is not None:
+        for name, value in headers.items():
+            response[name] = value
+    return response
@@ -1,17 +1,39 @@
-from django_filters.rest_framework import DjangoFilterBackend, FilterSet, DateTimeFilter
+import hashlib
+
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
+from django_filters.rest_framework import DjangoFilterBackend, FilterSet
+from django_filters.utils import translate_validation
 from rest_framework import filters
 from rest_framework.decorators import action
-from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework import mixins, viewsets
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from django.db.models.functions import TruncDay
-from django.db.models import Count
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.db.models import Sum, Prefetch
+from django.shortcuts import get_object_or_404
 
-from deliveries.auth import CookieJWTAuthentication
-from deliveries.models import Delivery, PackagingType, Service, CargoType
-from deliveries.serializers import DeliverySerializer, PackagingTypeSerializer, ServiceSerializer, CargoTypeSerializer
+from deliveries.auth import CookieJWTAuthentication, CookieJWTStatelessAuthentication
+from deliveries.cache import get_or_compute_summary, summary_stats, reference_cache, ReferenceEntry
+from deliveries import ingest, jobs, media
+from deliveries.export import STREAMERS, EXPORT_FORMATS, export_rows
+from deliveries.filters import LocalDateFilter, RelatedSearchFilter, local_date, local_day_start, normalize_plate
+from deliveries.models import Delivery, PackagingType, Service, CargoType, DeliveryDailySummary, MediaUpload, Job, \
+    JobStatusEnum
+from deliveries.serializers import DeliverySerializer, DeliveryRowSerializer, PackagingTypeSerializer, ServiceSerializer, \
+    CargoTypeSerializer, MediaUploadSerializer, MediaAttachSerializer, JobSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from deliveries.pagination import DeliveriesPageNumberPagination
+from deliveries.pagination import (
+    DeliveriesPageNumberPagination,
+    DeliveriesCursorPagination,
+    DeliveriesEstimatedCountPagination,
+)
+from deliveries.renderers import PassthroughRenderer
+from deliveries.routers import read_alias
+from deliveries.versions import get_version, not_modified, validator_headers
 from rest_framework.views import APIView
 from rest_framework import status
 
@@ -19,8 +41,8 @@ from deliveries_test_task import settings
 
 
 class DeliveryFilter(FilterSet):
-    departure_datetime__gte = DateTimeFilter(field_name='departure_datetime', lookup_expr='date__gte')
-    departure_datetime__lte = DateTimeFilter(field_name='departure_datetime', lookup_expr='date__lte')
+    departure_datetime__gte = LocalDateFilter(field_name='departure_datetime', lookup_expr='gte')
+    departure_datetime__lte = LocalDateFilter(field_name='departure_datetime', lookup_expr='lte')
 
     class Meta:
         model = Delivery
@@ -32,72 +54,336 @@ class DeliveryViewSet(viewsets.ModelViewSet):
     authentication_classes = [CookieJWTAuthentication]
     serializer_class = DeliverySerializer
     pagination_class = DeliveriesPageNumberPagination
+    # ?pagination=cursor — keyset-пагинация без COUNT(*) и OFFSET,
+    # ?pagination=estimated — оценочный count выше EXACT_COUNT_THRESHOLD
+    pagination_query_param = 'pagination'
+    pagination_classes = {
+        'cursor': DeliveriesCursorPagination,
+        'estimated': DeliveriesEstimatedCountPagination,
+    }
     filterset_class = DeliveryFilter
     filter_backends = [
         DjangoFilterBackend,  # для фильтрации по полям filterset_fields
-        filters.SearchFilter,  # для search_fields
+        RelatedSearchFilter,  # для search_fields, через trigram-индексы
         filters.OrderingFilter,  # для ordering_fields
     ]
     search_fields = [
         'transport_model__plate_number',
         'user__username',
     ]
+    # «A123» латиницей находит «А123»
+    search_normalizers = {
+        'transport_model__plate_number': normalize_plate,
+    }
     ordering_fields = ['departure_datetime', 'distance_km']
     ordering = ['-departure_datetime']
+    export_chunk_size = 2000
+    # Ответы этих действий определяются версией данных пользователя (deliveries.versions)
+    conditional_actions = ('list', 'retrieve', 'summary_by_day')
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            mode = self.request.query_params.get(self.pagination_query_param) if self.request else None
+            pagination_class = self.pagination_classes.get(mode, self.pagination_class)
+            self._paginator = pagination_class() if pagination_class else None
+        return self._paginator
 
     def get_queryset(self):
         return Delivery.objects.select_related(
             'transport_model', 'packaging', 'cargo_type', 'user'
-        ).prefetch_related('services').filter(user=self.request.user)
+        ).prefetch_related(
+            Prefetch('services', queryset=Service.objects.order_by('id'))
+        ).filter(user=self.request.user)
+
+    def check_not_modified(self, request):
+        """304, если у клиента актуальный ответ, — до основного запроса и сериализации."""
+        self.data_version = get_version(request.user.pk)
+        self.validator_headers = validator_headers(request, request.user.pk, self.data_version)
+        return not_modified(request, self.data_version, self.validator_headers)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.action in self.conditional_actions and response.status_code == 200 \
+                and hasattr(self, 'validator_headers'):
+            for name, value in self.validator_headers.items():
+                response[name] = value
+        return response
+
+    def list(self, request, *args, **kwargs):
+        response = self.check_not_modified(request)
+        if response is not None:
+            return response
+        # Список строится из .values() через DeliveryRowSerializer — тот же JSON,
+        # что у DeliverySerializer, без создания моделей и вложенных сериализаторов
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.prefetch_related(None).values(*DeliveryRowSerializer.values_fields)
+        context = self.get_serializer_context()
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            serializer = DeliveryRowSerializer(page, many=True, context=context)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = DeliveryRowSerializer(rows, many=True, context=context)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        response = self.check_not_modified(request)
+        if response is not None:
+            return response
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False, methods=['get'], url_path='export',
+            renderer_classes=[JSONRenderer, PassthroughRenderer])
+    def export(self, request):
+        """
+        Потоковая выгрузка всех доставок пользователя с учётом фильтров,
+        поиска и сортировки списка. ?export_format=csv (по умолчанию) или ndjson.
+        """
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in STREAMERS:
+            raise ValidationError({'export_format': f'Допустимые значения: {", ".join(STREAMERS)}.'})
+
+        # Строки читаются уже после выхода из middleware маршрутизации — БД выбираем сейчас
+        queryset = self.filter_queryset(self.get_queryset()).using(read_alias())
+        rows = export_rows(queryset, chunk_size=self.export_chunk_size)
+        response = StreamingHttpResponse(STREAMERS[export_format](rows), content_type=EXPORT_FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="deliveries.{export_format}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Приём доставок пачкой (deliveries/ingest.py): JSON-массив или NDJSON
+        (Content-Type: application/x-ndjson, тело читается построчно). Строки
+        с ошибками пропускаются и возвращаются в errors с номером строки.
+        """
+        if request.content_type.split(';')[0].strip() in ingest.NDJSON_CONTENT_TYPES:
+            # Тело читается потоком, мимо парсеров DRF
+            rows = ingest.iter_ndjson(request.stream or ())
+        else:
+            rows = request.data
+            if not isinstance(rows, list):
+                raise ValidationError({'non_field_errors': ['Ожидается массив объектов.']})
+        created, errors = ingest.ingest(rows, request.user.pk)
+        response_status = status.HTTP_400_BAD_REQUEST if errors and not created else status.HTTP_201_CREATED
+        return Response({'created': created, 'errors': errors}, status=response_status)
+
+    @action(detail=True, methods=['post'], url_path='media')
+    def attach_media(self, request, pk=None):
+        """Прикрепить полностью загруженный файл (см. MediaUploadViewSet) как медиафайл доставки."""
+        delivery = self.get_object()
+        serializer = MediaAttachSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = get_object_or_404(MediaUpload, pk=serializer.validated_data['upload'], user=request.user)
+        media.attach(upload, delivery)
+        return Response(self.get_serializer(delivery).data)
 
     @action(detail=False, methods=['get'], url_path='summary')
     def summary_by_day(self, request):
-        qs = self.get_queryset()
-        params = request.query_params
-
-        if params.get('departure_datetime__gte'):
-            qs = qs.filter(departure_datetime__date__gte=params['departure_datetime__gte'])
-        if params.get('departure_datetime__lte'):
-            qs = qs.filter(departure_datetime__date__lte=params['departure_datetime__lte'])
-        if params.get('cargo_type'):
+        response = self.check_not_modified(request)
+        if response is not None:
+            return response
+        params = self.get_summary_params(request)
+        result, cached = get_or_compute_summary(
+            request.user.pk, params, lambda: self.compute_summary(request.user, params),
+            version=self.data_version[0],
+        )
+        return Response(result, headers={'X-Cache': 'HIT' if cached else 'MISS'})
+
+    @staticmethod
+    def get_summary_params(request):
+        # Те же параметры и их валидация, что у фильтров списка
+        filterset = DeliveryFilter(request.query_params, queryset=Delivery.objects.none(), request=request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        cleaned = filterset.form.cleaned_data
+        return {
+            'departure_datetime__gte': cleaned.get('departure_datetime__gte') and local_date(cleaned['departure_datetime__gte']),
+            'departure_datetime__lte': cleaned.get('departure_datetime__lte') and local_date(cleaned['departure_datetime__lte']),
+            'cargo_type': cleaned.get('cargo_type') and cleaned['cargo_type'].pk,
+            'services': request.query_params.get('services'),
+        }
+
+    @staticmethod
+    def summary_queryset(user, params):
+        # Читаем из дневной сводки: service=NULL — итог по всем доставкам дня
+        qs = DeliveryDailySummary.objects.filter(user=user, deliveries_count__gt=0)
+        if params['departure_datetime__gte']:
+            qs = qs.filter(day__gte=params['departure_datetime__gte'])
+        if params['departure_datetime__lte']:
+            qs = qs.filter(day__lte=params['departure_datetime__lte'])
+        if params['cargo_type']:
             qs = qs.filter(cargo_type_id=params['cargo_type'])
-        if params.get('services'):
-            qs = qs.filter(services__id=params['services'])
+        if params['services']:
+            qs = qs.filter(service_id=params['services'])
+        else:
+            qs = qs.filter(service__isnull=True)
 
-        daily = (
+        return (
             qs
-            .annotate(day=TruncDay('departure_datetime'))
             .values('day')
-            .annotate(count=Count('id'))
+            .annotate(count=Sum('deliveries_count'))
             .order_by('day')
         )
 
-        result = [
-            {'day': item['day'], 'count': item['count']}
-            for item in daily
+    @classmethod
+    def compute_summary(cls, user, params):
+        return [
+            {'day': local_day_start(item['day']), 'count': item['count']}
+            for item in cls.summary_queryset(user, params)
+        ]
+
+    @classmethod
+    async def acompute_summary(cls, user, params):
+        return [
+            {'day': local_day_start(item['day']), 'count': item['count']}
+            async for item in cls.summary_queryset(user, params)
         ]
-        return Response(result)
+
+    @action(detail=False, methods=['get'], url_path='summary/cache-stats', permission_classes=[IsAdminUser])
+    def summary_cache_stats(self, request):
+        return Response(summary_stats.as_dict())
+
+
+class MediaUploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin,
+                         viewsets.GenericViewSet):
+    """
+    Загрузка медиафайла по частям (deliveries/media.py): POST — создать загрузку
+    с именем и размером файла, PUT с Content-Range и байтами в теле — следующая
+    часть, GET — сколько принято, DELETE — отменить.
+    """
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CookieJWTAuthentication]
+    serializer_class = MediaUploadSerializer
+
+    def get_queryset(self):
+        return MediaUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def update(self, request, *args, **kwargs):
+        upload = media.receive_chunk(
+            self.get_object(),
+            # Тело читается потоком, мимо парсеров DRF
+            request.stream,
+            request.headers.get('Content-Range'),
+            int(request.META.get('CONTENT_LENGTH') or 0),
+        )
+        return Response(self.get_serializer(upload).data)
+
+    def perform_destroy(self, instance):
+        media.discard(instance)
 
 
-class PackagingTypeViewSet(viewsets.ReadOnlyModelViewSet):
+class JobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                 viewsets.GenericViewSet):
+    """
+    Фоновые задания пользователя (deliveries/jobs.py, выполняет воркер run_jobs):
+    POST — поставить в очередь, GET — статус и результат, POST cancel — отменить
+    ещё не начатое, GET download — файл выгрузки.
+    """
     permission_classes = [IsAuthenticated]
     authentication_classes = [CookieJWTAuthentication]
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user).order_by('-created_at')
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = jobs.enqueue(data['kind'], data['params'], user=self.request.user)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        job = self.get_object()
+        if not Job.objects.filter(pk=job.pk, status=JobStatusEnum.QUEUED).update(status=JobStatusEnum.CANCELLED):
+            return Response({'detail': 'Отменить можно только задание в очереди.'}, status=status.HTTP_409_CONFLICT)
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, PassthroughRenderer])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        name = (job.result or {}).get('file') if job.status == JobStatusEnum.SUCCEEDED else None
+        if not name:
+            raise Http404
+        response = media.serve(request, name)
+        response['Content-Disposition'] = f'attachment; filename="{name.rpartition("/")[2]}"'
+        return response
+
+
+@require_safe
+def protected_media(request, name):
+    """
+    Медиафайл или превью доставки (MEDIA_URL): только владельцу по JWT-куке API
+    или сотруднику по сессии админки. Чужой файл — 404, как несуществующий.
+    """
+    user = request.user if request.user.is_authenticated else None
+    if user is None:
+        auth = CookieJWTAuthentication().authenticate(request)
+        user = auth and auth[0]
+    if user is None:
+        return HttpResponse(status=401)
+    if not media.can_access(user, name):
+        raise Http404
+    return media.serve(request, name)
+
+
+class ReferenceCacheMixin:
+    """
+    Список справочника из кэша процесса с ETag: повторный запрос
+    с совпадающим If-None-Match получает 304 без обращения к БД.
+    В кэше — весь справочник, одна запись на путь; страница и её ссылки
+    next/previous строятся для каждого запроса, поэтому Host и произвольные
+    параметры запроса не плодят записей и не вытесняют нужные.
+    """
+
+    def list(self, request, *args, **kwargs):
+        cache = reference_cache(self.queryset.model)
+        entry = cache.get(request.path)
+        if entry is None:
+            data = self.get_serializer(self.filter_queryset(self.get_queryset()), many=True).data
+            content = JSONRenderer().render(data)
+            entry = ReferenceEntry(data, quote_etag(hashlib.md5(content).hexdigest()))
+            cache.set(request.path, entry)
+
+        not_modified = get_conditional_response(request, etag=entry.etag)
+        if not_modified is not None:
+            return not_modified
+        return Response(self.reference_page(entry, request), headers={'ETag': entry.etag})
+
+    @classmethod
+    def reference_page(cls, entry, request):
+        """Данные ответа на DRF-запрос request по записи кэша: страница списка без обращения к БД."""
+        paginator = cls.pagination_class() if cls.pagination_class else None
+        page = paginator.paginate_queryset(entry.data, request) if paginator else None
+        if page is None:
+            return entry.data
+        return paginator.get_paginated_response(page).data
+
+
+class PackagingTypeViewSet(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CookieJWTStatelessAuthentication]  # справочникам не нужен пользователь из БД
     queryset = PackagingType.objects.all()
     serializer_class = PackagingTypeSerializer
     ordering = ['id']
 
 
-class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
+class ServiceViewSet(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [CookieJWTAuthentication]
+    authentication_classes = [CookieJWTStatelessAuthentication]
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
     ordering = ['id']
 
 
-class CargoTypeViewSet(viewsets.ReadOnlyModelViewSet):
+class CargoTypeViewSet(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [CookieJWTAuthentication]
+    authentication_classes = [CookieJWTStatelessAuthentication]
     queryset = CargoType.objects.all()
     serializer_class = CargoTypeSerializer
     ordering = ['id']
@@ -0,0 +1,13 @@
+"""
+Инициализация процессов пула воркера run_jobs. Модуль не импортирует модели:
+процесс пула запускается через spawn и импортирует его до django.setup().
+"""
+import signal
+
+import django
+
+
+def init_worker():
+    # Ctrl+C получает только родитель: он дожидается текущих заданий и завершает работу
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    django.setup()
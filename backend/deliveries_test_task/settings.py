@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
+import copy
 import os
 from datetime import timedelta
 from pathlib import Path
@@ -27,6 +28,8 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv("DEBUG") == "True"
 ALLOWED_HOSTS = os.getenv("DJANGO_ALLOWED_HOSTS", "").split(",")
+# Async-представления горячих эндпоинтов (deliveries/async_views.py); имеет смысл под ASGI (uvicorn)
+ASYNC_API = os.getenv('ASYNC_API') == 'True'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -34,12 +37,47 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', '1111'),
         'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
-        'PORT': '5432',
+        'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        # Проверять переиспользуемое соединение перед запросом
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+        # Для pgbouncer в режиме transaction pooling: .iterator() без серверных курсоров
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_DISABLE_SERVER_SIDE_CURSORS') == 'True',
+        'OPTIONS': {},
         'TEST': {
             'NAME': 'test_deliverydb',  # Явное имя тестовой базы
         },
     }
 }
+# Пул соединений psycopg 3 внутри процесса (нужен psycopg[pool]); несовместим с CONN_MAX_AGE > 0
+DB_POOL = os.getenv('DB_POOL') == 'True'
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    }
+# Время жизни соединения между запросами, с: 0 — новое соединение на каждый запрос.
+# Под ASGI соединения привязаны к потокам, а не к воркеру, поэтому там — только пул.
+DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv(
+    'DB_CONN_MAX_AGE', 0 if DB_POOL or ASYNC_API else 60
+))
+# Реплики для чтения: DB_REPLICA_HOSTS=host1,host2:5433 (остальные параметры — как у default).
+# Для локальной проверки можно указать тот же хост, что и у primary.
+DB_REPLICAS = []
+for index, replica_host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    host, _, port = replica_host.strip().partition(':')
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        **copy.deepcopy(DATABASES['default']),
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DB_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['deliveries.routers.PrimaryReplicaRouter']
+# Сколько секунд после записи читать клиенту с primary и сколько не обращаться к упавшей реплике
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+DB_REPLICA_RETRY_SECONDS = int(os.getenv('DB_REPLICA_RETRY_SECONDS', 30))
 AUTH_USER_MODEL = 'auth.User'
 
 SIMPLE_JWT = {
@@ -65,7 +103,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'deliveries.streaming.AsyncStreamingMiddleware',
+    'deliveries.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'deliveries.routers.ReplicaRoutingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -125,8 +166,45 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10
 }
+# ?pagination=estimated: до скольких строк count считается точно, выше — оценка из EXPLAIN
+EXACT_COUNT_THRESHOLD = int(os.getenv('EXACT_COUNT_THRESHOLD', 10000))
 WSGI_APPLICATION = 'deliveries_test_task.wsgi.application'
 
+# Кэш ответов /deliveries/summary/: в памяти процесса по умолчанию,
+# Redis-совместимый сервер — если задан SUMMARY_CACHE_URL (нужен пакет redis)
+SUMMARY_CACHE_URL = os.getenv('SUMMARY_CACHE_URL')
+if SUMMARY_CACHE_URL:
+    SUMMARY_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': SUMMARY_CACHE_URL,
+    }
+else:
+    SUMMARY_CACHE = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'summary',
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', 10000))},
+    }
+SUMMARY_CACHE['TIMEOUT'] = int(os.getenv('SUMMARY_CACHE_TIMEOUT', 300))
+# Кэш справочников (cargo, services, packaging) в памяти процесса
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT', 300))
+REFERENCE_CACHE_MAX_ENTRIES = int(os.getenv('REFERENCE_CACHE_MAX_ENTRIES', 256))
+# Кэш номеров транспорта для POST /deliveries/bulk/ (номер → id), время жизни — REFERENCE_CACHE_TIMEOUT
+PLATE_CACHE_MAX_ENTRIES = int(os.getenv('PLATE_CACHE_MAX_ENTRIES', 10000))
+# Кэш пользователей при аутентификации по JWT (0 — выключен, пользователь читается из БД)
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', 0))
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_USER_CACHE_MAX_ENTRIES', 1024))
+# Метрики запросов: заголовок Server-Timing, /metrics и лог медленных запросов (deliveries/metrics.py)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_SLOW_QUERY_MS = float(os.getenv('METRICS_SLOW_QUERY_MS', 100))
+METRICS_REPEATED_QUERY_THRESHOLD = int(os.getenv('METRICS_REPEATED_QUERY_THRESHOLD', 10))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'summary': SUMMARY_CACHE,
+}
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -166,6 +244,40 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+
+# Медиафайлы доставок
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+# Загрузка по частям (deliveries/media.py): предельный размер файла, каталог для
+# недогруженных файлов и через сколько часов без новых частей загрузка считается брошенной
+MEDIA_UPLOAD_MAX_SIZE = int(os.getenv('MEDIA_UPLOAD_MAX_SIZE', 50 * 1024 * 1024))
+MEDIA_UPLOAD_TEMP_DIR = os.getenv('MEDIA_UPLOAD_TEMP_DIR', os.path.join(MEDIA_ROOT, 'uploads'))
+MEDIA_UPLOAD_EXPIRE_HOURS = int(os.getenv('MEDIA_UPLOAD_EXPIRE_HOURS', 24))
+# Через сколько секунд без сигнала запрос, принимающий часть (упал процесс), перестаёт её держать
+MEDIA_UPLOAD_CLAIM_SECONDS = int(os.getenv('MEDIA_UPLOAD_CLAIM_SECONDS', 120))
+# Превью изображений: размер по большей стороне и потоков на процесс (0 — строить сразу, в запросе)
+MEDIA_PREVIEW_SIZE = int(os.getenv('MEDIA_PREVIEW_SIZE', 320))
+MEDIA_PREVIEW_WORKERS = int(os.getenv('MEDIA_PREVIEW_WORKERS', 2))
+# Отдача медиафайлов после проверки доступа: пусто — FileResponse (sendfile в gunicorn),
+# X-Accel-Redirect — через nginx (internal location MEDIA_ACCEL_PREFIX), X-Sendfile — Apache/lighttpd
+MEDIA_OFFLOAD_HEADER = os.getenv('MEDIA_OFFLOAD_HEADER', '')
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+# Строить превью заданиями очереди (нужен воркер run_jobs), а не в потоках веб-процесса
+MEDIA_PREVIEW_QUEUE = os.getenv('MEDIA_PREVIEW_QUEUE') == 'True'
+
+# Фоновые задания (deliveries/jobs.py, команда run_jobs): процессов воркера, опрос очереди (с),
+# попыток на задание, базовая задержка повтора (удваивается с каждой попыткой, с)
+# и через сколько секунд без сигнала воркера задание считается брошенным
+JOBS_WORKER_PROCESSES = int(os.getenv('JOBS_WORKER_PROCESSES', 2))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', 1))
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', 3))
+JOBS_RETRY_BACKOFF_SECONDS = int(os.getenv('JOBS_RETRY_BACKOFF_SECONDS', 30))
+JOBS_LEASE_SECONDS = int(os.getenv('JOBS_LEASE_SECONDS', 300))
+# Сколько часов хранится файл выполненной выгрузки; потом его удаляет воркер run_jobs
+EXPORT_RESULT_TTL_HOURS = int(os.getenv('EXPORT_RESULT_TTL_HOURS', 24))
+
+# Приём доставок (POST /deliveries/bulk/): строк в одной транзакции
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 1000))
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -19,7 +19,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from django.conf import settings
 from django.conf.urls.static import static
-from deliveries.views import DeliveryViewSet
+from deliveries.views import DeliveryViewSet, protected_media
 
 router = DefaultRouter()
 urlpatterns = [
@@ -27,3 +27,10 @@ urlpatterns = [
     path('api/v1/', include('deliveries.urls')),  # всё, что внутри deliveries/urls.py
 ]
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+# Медиафайлы — с проверкой владельца (deliveries.media.serve), не через static()
+urlpatterns.append(path(f'{settings.MEDIA_URL.lstrip("/")}<path:name>', protected_media))
+
+if settings.METRICS_ENABLED:
+    from deliveries.metrics import metrics_view
+
+    urlpatterns.append(path('metrics', metrics_view))
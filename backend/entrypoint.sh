@@ -21,4 +21,10 @@ echo "=> Populating database with 1000 entries…"
 python3 manage.py populate_db --count=1000
 
 echo "=> Starting server…"
+if [ "$ASYNC_API" = "True" ]; then
+  # ASGI: async-представления deliveries/async_views.py под воркерами uvicorn
+  # Потоковые ответы читаются порциями (deliveries/streaming.py), sendfile нет —
+  # медиафайлы в этом режиме лучше отдавать прокси (MEDIA_OFFLOAD_HEADER)
+  exec gunicorn deliveries_test_task.asgi:application --worker-class uvicorn_worker.UvicornWorker --bind 0.0.0.0:8000
+fi
 exec gunicorn deliveries_test_task.wsgi:application --bind 0.0.0.0:8000